@@ -0,0 +1,287 @@
+import multiprocessing
+import numpy as np
+import torch
+from torch.utils import data
+from crf import CONFIDENCE_COLUMNS
+
+
+# name -> (function, needs_marginals). Every function maps the decode output of one pool batch to a
+# (batch_size,) tensor of confidences, lower is less confident, so the pool is ranked in ascending order.
+ACQUISITION_FUNCTIONS = {}
+
+
+def register_acquisition(name, needs_marginals=False):
+    '''
+    Decorator adding an acquisition function to ACQUISITION_FUNCTIONS under `name`.
+    Functions with needs_marginals=True get the CRF marginals in batch['marginals'].
+    '''
+    def register(fn):
+        ACQUISITION_FUNCTIONS[name] = (fn, needs_marginals)
+        return fn
+    return register
+
+
+def get_acquisition(names):
+    '''
+    Parses a comma separated list of strategy names, e.g. "SE,Margin", into a list of registered names.
+    '''
+    names = [name.strip() for name in names.split(',')] if isinstance(names, str) else list(names)
+    for name in names:
+        if name not in ACQUISITION_FUNCTIONS:
+            raise ValueError('Unknown acquisition function {}, choose from {}'.format(name, ', '.join(ACQUISITION_FUNCTIONS)))
+    return names
+
+
+#####  sequence level, from the softmax over the final Viterbi deltas  #####
+
+@register_acquisition('SE')
+def sequence_entropy(batch):
+    return batch['confidence'][:, CONFIDENCE_COLUMNS['SE']]
+
+
+@register_acquisition('NLC')
+def normalized_least_confidence(batch):
+    return batch['confidence'][:, CONFIDENCE_COLUMNS['NLC']]
+
+
+@register_acquisition('Margin')
+def margin(batch):
+    return batch['confidence'][:, CONFIDENCE_COLUMNS['Margin']]
+
+
+#####  token level, from the CRF marginals of the first sub-word of every word  #####
+
+def _word_marginals(batch):
+    # (batch_size, T, num_labels) marginals and (batch_size, T) mask of the positions that predict a word
+    words = batch['predict_mask'].bool()
+    return batch['marginals'] * words.unsqueeze(-1).to(batch['marginals'].dtype), words
+
+
+@register_acquisition('TokenEntropy', needs_marginals=True)
+def token_entropy(batch):
+    '''
+    mean over words of sum p*log(p) of their marginals
+    '''
+    marginals, words = _word_marginals(batch)
+    plogp = torch.where(marginals > 0, marginals * marginals.clamp_min(1e-12).log(), torch.zeros_like(marginals)).sum(-1)
+    return plogp.sum(1) / words.sum(1).clamp_min(1).to(plogp.dtype)
+
+
+@register_acquisition('TokenMargin', needs_marginals=True)
+def token_margin(batch):
+    '''
+    smallest margin between the two most probable labels of any word
+    '''
+    marginals, words = _word_marginals(batch)
+    top2 = marginals.topk(2, dim=-1)[0]
+    word_margin = torch.where(words, top2[..., 0] - top2[..., 1], torch.ones_like(top2[..., 0]))
+    return word_margin.min(1)[0]
+
+
+#####  span level, over the entities of the Viterbi path  #####
+
+@register_acquisition('SpanConfidence', needs_marginals=True)
+def span_confidence(batch):
+    '''
+    lowest mean log marginal of the predicted labels of a predicted entity span (B-x I-x ...);
+    sentences without a predicted entity use their least confident word
+    '''
+    words = batch['predict_mask'].bool()
+    # move the word positions to the front of every row, so neighbours in a row are neighbouring words
+    order = torch.sort((~words).to(torch.uint8), dim=1, stable=True)[1]
+    words = words.gather(1, order)
+    labels = batch['path'].gather(1, order)
+    marginals = batch['marginals'].gather(1, order.unsqueeze(-1).expand_as(batch['marginals']))
+    log_prob = marginals.gather(-1, labels.unsqueeze(-1)).squeeze(-1).clamp_min(1e-12).log()
+
+    is_b = batch['begin_label_mask'][labels] & words
+    is_i = batch['inside_label_mask'][labels] & words
+    entity = is_b | is_i
+    prev_entity = torch.cat([torch.zeros_like(entity[:, :1]), entity[:, :-1]], dim=1)
+    start = is_b | (is_i & ~prev_entity)
+    # 0 outside entities, 1.. the span of every entity position
+    span_id = torch.cumsum(start.long(), dim=1) * entity.long()
+    span_sum = log_prob.new_zeros((log_prob.shape[0], log_prob.shape[1] + 1)).scatter_add(1, span_id, log_prob * entity)
+    span_len = log_prob.new_zeros(span_sum.shape).scatter_add(1, span_id, entity.to(log_prob.dtype))
+    inf = torch.full_like(log_prob, float('inf'))
+    span_score = torch.where(span_len[:, 1:] > 0, span_sum[:, 1:] / span_len[:, 1:].clamp_min(1), inf).min(1)[0]
+    word_score = torch.where(words, log_prob, inf).min(1)[0]
+    return torch.where(torch.isfinite(span_score), span_score, word_score)
+
+
+class TopKSelector(object):
+    '''
+    Keeps the ids of the k least confident sentences seen so far, fed batch by batch,
+    so selecting from a pool of any size needs O(k + batch_size) memory instead of a full sort.
+    The sentence embeddings passed to update() are kept alongside, for diverse().
+    '''
+
+    def __init__(self, k):
+        self.k = k
+        self.scores = np.zeros(0, dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.embeddings = None
+
+    def update(self, scores, ids, embeddings=None):
+        scores = np.concatenate([self.scores, np.asarray(scores, dtype=np.float32)])
+        ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        if embeddings is not None:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            if self.embeddings is not None:
+                embeddings = np.concatenate([self.embeddings, embeddings])
+        if len(scores) > self.k:
+            keep = np.argpartition(scores, self.k - 1)[:self.k] if self.k > 0 else []
+            scores, ids = scores[keep], ids[keep]
+            if embeddings is not None:
+                embeddings = embeddings[keep]
+        self.scores, self.ids, self.embeddings = scores, ids, embeddings
+
+    def selected(self):
+        '''
+        the kept ids and their scores, least confident first
+        '''
+        order = np.argsort(self.scores, kind='stable')
+        return self.ids[order], self.scores[order]
+
+    def diverse(self, k):
+        '''
+        `k` of the kept ids and their scores, picked by k_center_greedy over their embeddings starting from
+        the least confident, so near duplicates among the uncertain sentences are not selected together
+        '''
+        order = np.argsort(self.scores, kind='stable')
+        picked = order[k_center_greedy(self.embeddings[order], k)]
+        return self.ids[picked], self.scores[picked]
+
+
+def k_center_greedy(embeddings, k):
+    '''
+    Core-set selection: picks row 0, then repeatedly the row farthest (cosine distance) from all the rows picked
+    so far. The distance of every row to its nearest picked row is updated with one matrix-vector product per
+    pick, O(k * rows * dim) in total. Returns the picked rows in pick order.
+    '''
+    k = min(k, len(embeddings))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True).clip(1e-12)
+    picked = [0]
+    min_dist = 1.0 - embeddings.dot(embeddings[0])
+    for _ in range(1, k):
+        i = int(np.argmax(min_dist))
+        picked.append(i)
+        min_dist = np.minimum(min_dist, 1.0 - embeddings.dot(embeddings[i]))
+    return np.array(picked, dtype=np.int64)
+
+
+def label_masks(label_list, device):
+    '''
+    boolean lookups over label ids marking the B- and I- labels, used by the span level functions
+    '''
+    begin = torch.tensor([label.startswith('B-') for label in label_list], device=device)
+    inside = torch.tensor([label.startswith('I-') for label in label_list], device=device)
+    return begin, inside
+
+
+def _score_batches(model, pool_dataloader, strategies, label_list, device, selectors, keep_scores, diverse):
+    '''
+    decodes the batches of pool_dataloader and feeds their scores to `selectors`, one per strategy
+    '''
+    functions = [ACQUISITION_FUNCTIONS[name] for name in strategies]
+    needs_marginals = any(needs for _, needs in functions)
+    begin_label_mask, inside_label_mask = label_masks(label_list, device)
+
+    model.eval()
+    batch_scores = []
+    all_preds = []
+    all_labels = []
+    # pool loaders do not shuffle, so the batch sampler replays the order the loader visits the pool in
+    pool_ids = iter(pool_dataloader.batch_sampler)
+    with torch.no_grad():
+        for batch in pool_dataloader:
+            batch_ids = next(pool_ids)
+            batch = tuple(t.to(device) for t in batch)
+            input_ids, input_mask, segment_ids, predict_mask, label_ids = batch
+            confidence, predicted_label_seq_ids, marginals, embeddings = model.decode(
+                input_ids, segment_ids, input_mask, marginals=needs_marginals, embeddings=diverse)
+            decoded = {'confidence': confidence, 'path': predicted_label_seq_ids, 'marginals': marginals,
+                       'input_mask': input_mask, 'predict_mask': predict_mask,
+                       'begin_label_mask': begin_label_mask, 'inside_label_mask': inside_label_mask}
+            # one transfer per batch for all the strategies
+            scores = torch.stack([fn(decoded) for fn, _ in functions], dim=1).cpu().numpy()
+            if diverse:
+                embeddings = embeddings.cpu().numpy()
+            for i, selector in enumerate(selectors):
+                selector.update(scores[:, i], batch_ids, embeddings)
+            if keep_scores:
+                batch_scores.append((batch_ids, scores))
+            all_preds.append(torch.masked_select(predicted_label_seq_ids, predict_mask.bool()).cpu().numpy().astype(np.int8))
+            all_labels.append(torch.masked_select(label_ids, predict_mask.bool()).cpu().numpy().astype(np.int8))
+    return batch_scores, all_preds, all_labels
+
+
+# what the pool scoring processes need, set just before they are forked so they inherit it (the model weights
+# included) copy-on-write instead of receiving a pickled copy
+_shard_args = None
+
+
+def _score_shard(batches):
+    model, dataset, collate_fn, strategies, label_list, selectors, keep_scores, diverse = _shard_args
+    # the OpenMP thread pool the parent already used does not survive the fork, a forked process running torch
+    # with more than one thread hangs, so every process scores its shard with one thread
+    torch.set_num_threads(1)
+    shard_dataloader = data.DataLoader(dataset=dataset, batch_sampler=batches, collate_fn=collate_fn)
+    batch_scores, all_preds, all_labels = _score_batches(model, shard_dataloader, strategies, label_list,
+                                                         torch.device('cpu'), selectors, keep_scores, diverse)
+    return batch_scores, all_preds, all_labels, selectors
+
+
+def score_pool(model, pool_dataloader, strategies, label_list, device, num_select=0, keep_scores=True,
+               diversity=0, num_processes=0):
+    '''
+    One batched pass over the pool: decodes every sentence once and computes all the `strategies` from it.
+    Returns {strategy: scores in pool order} (None unless `keep_scores`), {strategy: (ids, scores) of the
+    `num_select` least confident sentences, least confident first}, and the flattened predicted and gold
+    labels of the words.
+    With `diversity` > 1 the `diversity * num_select` least confident sentences are kept with their [CLS]
+    embeddings from the same pass, and `num_select` of them are selected by TopKSelector.diverse instead.
+    With `num_processes` > 1 on CPU the batches are split into contiguous shards scored by that many forked
+    processes, each running torch with a single thread, and their top-k candidates are merged here; use as many
+    processes as cores.
+    '''
+    global _shard_args
+    strategies = get_acquisition(strategies)
+    diverse = diversity > 1
+    selectors = [TopKSelector(num_select * diversity if diverse else num_select) for _ in strategies]
+
+    if num_processes > 1 and device.type == 'cpu':
+        batches = list(pool_dataloader.batch_sampler)
+        shards = [shard.tolist() for shard in np.array_split(np.arange(len(batches)), num_processes) if len(shard)]
+        shards = [[batches[i] for i in shard] for shard in shards]
+        _shard_args = (model, pool_dataloader.dataset, pool_dataloader.collate_fn, strategies, label_list,
+                       selectors, keep_scores, diverse)
+        try:
+            with multiprocessing.get_context('fork').Pool(len(shards)) as workers:
+                results = workers.map(_score_shard, shards)
+        finally:
+            _shard_args = None
+        batch_scores, all_preds, all_labels = [], [], []
+        for shard_scores, shard_preds, shard_labels, shard_selectors in results:
+            batch_scores += shard_scores
+            all_preds += shard_preds
+            all_labels += shard_labels
+            for selector, shard_selector in zip(selectors, shard_selectors):
+                selector.update(shard_selector.scores, shard_selector.ids, shard_selector.embeddings)
+    else:
+        batch_scores, all_preds, all_labels = _score_batches(model, pool_dataloader, strategies, label_list, device,
+                                                             selectors, keep_scores, diverse)
+
+    pool_scores = None
+    if keep_scores:
+        pool_scores = np.zeros((len(pool_dataloader.dataset), len(strategies)), dtype=np.float32)
+        for batch_ids, scores in batch_scores:
+            pool_scores[batch_ids] = scores
+        pool_scores = {name: pool_scores[:, i] for i, name in enumerate(strategies)}
+    selected = {name: selector.diverse(num_select) if diverse else selector.selected()
+                for name, selector in zip(strategies, selectors)}
+    all_preds = np.concatenate(all_preds) if all_preds else np.zeros(0, dtype=np.int8)
+    all_labels = np.concatenate(all_labels) if all_labels else np.zeros(0, dtype=np.int8)
+    return pool_scores, selected, all_preds, all_labels
@@ -0,0 +1,802 @@
+import sys
+import os
+import time
+import importlib
+import numpy as np
+import matplotlib.pyplot as plt
+import torch
+import torch.nn.functional as F
+import torch.nn as nn
+import torch.autograd as autograd
+import torch.optim as optim
+from torch.utils.data.distributed import DistributedSampler
+from torch.utils import data
+import argparse
+from tqdm import tqdm, trange
+import collections
+import itertools
+from pytorch_pretrained_bert.modeling import BertModel, BertForTokenClassification, BertLayerNorm
+import pickle
+from pytorch_pretrained_bert.optimization import BertAdam, WarmupLinearSchedule
+from pytorch_pretrained_bert.tokenization import BertTokenizer
+import shutil
+from crf import CRF
+from acquisition import ACQUISITION_FUNCTIONS, get_acquisition, score_pool
+from features import FeatureStore, CachedTokenizer, ArrayNerDataset, BucketBatchSampler
+from pool import ActiveLearningPool
+from fast_tokenizer import FastBertTokenizer
+from normalization import NORMALIZATION_TABLES, get_normalizer, normalization_report
+
+
+print('Python version ', sys.version)
+print('PyTorch version ', torch.__version__)
+cuda_yes = torch.cuda.is_available()
+print('Cuda is available?', cuda_yes)
+device = torch.device("cuda:0" if cuda_yes else "cpu")
+print('Device:', device)
+
+
+class InputExample(object):
+    """A single training/test example for NER."""
+
+    def __init__(self, guid, words, labels):
+        
+        self.guid = guid
+        self.words = words
+        self.labels = labels
+
+
+class DataProcessor(object):
+    """Base class for data converters for sequence classification data sets."""
+
+    def get_train_examples(self, data_dir):
+        """Gets a collection of `InputExample`s for the train set."""
+        raise NotImplementedError()
+
+    def get_dev_examples(self, data_dir):
+        """Gets a collection of `InputExample`s for the dev set."""
+        raise NotImplementedError()
+
+    def get_labels(self):
+        """Gets the list of labels for this data set."""
+        raise NotImplementedError()
+
+    @classmethod
+    def _read_data(cls, input_file):
+        """
+        Reads a IOB data.
+        """
+        return list(cls._iter_data(input_file))
+
+    @classmethod
+    def _iter_data(cls, input_file):
+        """
+        Streams a IOB data line by line, yields [words, ner_labels] for each sentence as soon as it ends.
+        CRLF line ends and runs of several blank lines are accepted.
+        """
+        words = []
+        ner_labels = []
+        with open(input_file, encoding='utf-8') as f:
+            for line in f:
+                pieces = line.split()
+                if len(pieces) < 1:
+                    if words:
+                        yield [words, ner_labels]
+                        words = []
+                        ner_labels = []
+                    continue
+                words.append(pieces[0])
+                ner_labels.append(pieces[-1])
+        if words:
+            yield [words, ner_labels]
+
+
+class CoNLLDataProcessor(DataProcessor):
+    '''
+    Processor for the CoNLL-2003 data set, `normalizer` (see normalization.get_normalizer) is applied to every word
+    '''
+
+    def __init__(self, normalizer=None):
+        self.normalizer = normalizer
+        self._label_types = [ 'X', '[CLS]', '[SEP]', 'O', 'I-loc', 'B-pers', 'I-pers', 'I-org', 'I-pro', 'B-pro','I-fac','B-fac', 'B-loc', 'B-org', 'B-event', 'I-event']
+        self._num_labels = len(self._label_types)
+        self._label_map = {label: i for i,
+                           label in enumerate(self._label_types)}
+
+    def get_train_examples(self, data_dir):
+        return self._create_examples(
+            self._read_data(os.path.join(data_dir, "train.txt")))
+
+    def get_test_examples(self, data_dir):
+        return self._create_examples(
+            self._read_data(os.path.join(data_dir, "valid.txt")))
+
+    def iter_examples(self, input_file):
+        '''
+        Lazily yields the `InputExample`s of an IOB file, e.g. to fill the feature cache of the mmap backend.
+        '''
+        for (i, one_lists) in enumerate(self._iter_data(input_file)):
+            words = one_lists[0]
+            if self.normalizer is not None:
+                words = self.normalizer.normalize_words(words)
+            yield InputExample(
+                guid=i, words=words, labels=one_lists[-1])
+
+    def get_labels(self):
+        return self._label_types
+
+    def get_num_labels(self):
+        return self.get_num_labels
+
+    def get_label_map(self):
+        return self._label_map
+    
+    def get_start_label_id(self):
+        return self._label_map['[CLS]']
+
+    def get_stop_label_id(self):
+        return self._label_map['[SEP]']
+
+    def _create_examples(self, all_lists):
+        if self.normalizer is not None:
+            # the words of the whole corpus are normalized in one pass, then split back into sentences
+            lengths = np.cumsum([len(one_lists[0]) for one_lists in all_lists])[:-1]
+            all_words = self.normalizer.normalize_words([word for one_lists in all_lists for word in one_lists[0]])
+            all_lists = [[list(words), one_lists[-1]] for words, one_lists in
+                         zip(np.split(np.array(all_words, dtype=object), lengths), all_lists)]
+        examples = []
+        for (i, one_lists) in enumerate(all_lists):
+            guid = i
+            words = one_lists[0]
+            labels = one_lists[-1]
+            examples.append(InputExample(
+                guid=guid, words=words, labels=labels))
+        return examples
+
+    def _create_examples2(self, lines):
+        examples = []
+        for (i, line) in enumerate(lines):
+            guid = i
+            text = line[0]
+            ner_label = line[-1]
+            examples.append(InputExample(
+                guid=guid, text_a=text, labels_a=ner_label))
+        return examples
+
+
+class NerDataset(data.Dataset):
+
+    def __init__(self, examples, tokenizer, label_map, max_seq_length, feature_store=None):
+        self.examples=examples
+        self.tokenizer=tokenizer
+        self.label_map=label_map
+        self.max_seq_length=max_seq_length
+        if feature_store is None:
+            feature_store = FeatureStore(tokenizer, label_map, max_seq_length)
+        # converted once here, every epoch, evaluation pass and DataLoader worker reuses them
+        self.features=[feature_store.get(example) for example in examples]
+
+    def __len__(self):
+        return len(self.examples)
+
+    def __getitem__(self, idx):
+        feat=self.features[idx]
+        return feat.input_ids, feat.input_mask, feat.segment_ids, feat.predict_mask, feat.label_ids
+
+    def lengths(self):
+        return [len(feat.input_ids) for feat in self.features]
+
+    @classmethod
+    def pad(cls, batch):
+
+        seqlen_list = [len(sample[0]) for sample in batch]
+        maxlen = np.array(seqlen_list).max()
+        f = lambda x, seqlen: [sample[x] + [0] * (seqlen - len(sample[x])) for sample in batch] # 0: X for padding
+        input_ids_list = torch.LongTensor(f(0, maxlen))
+        input_mask_list = torch.LongTensor(f(1, maxlen))
+        segment_ids_list = torch.LongTensor(f(2, maxlen))
+        predict_mask_list = torch.ByteTensor(f(3, maxlen))
+        label_ids_list = torch.LongTensor(f(4, maxlen))
+
+        return input_ids_list, input_mask_list, segment_ids_list, predict_mask_list, label_ids_list
+
+def f1_score(y_true, y_pred):
+    '''
+    0,1,2,3 represent [CLS],[SEP],[X],O
+    '''
+    ignore_id=3
+    num_proposed = len(y_pred[y_pred>ignore_id])
+    num_correct = (np.logical_and(y_true==y_pred, y_true>ignore_id)).sum()
+    num_gold = len(y_true[y_true>ignore_id])
+
+    try:
+        precision = num_correct / num_proposed
+    except ZeroDivisionError:
+        precision = 1.0
+
+    try:
+        recall = num_correct / num_gold
+    except ZeroDivisionError:
+        recall = 1.0
+
+    try:
+        f1 = 2*precision*recall / (precision + recall)
+    except ZeroDivisionError:
+        if precision*recall==0:
+            f1=1.0
+        else:
+            f1=0
+
+    return precision, recall, f1
+
+
+#####  BertModel + CRF  #####
+
+class BERT_CRF_NER(nn.Module):
+
+    def __init__(self, bert_model, start_label_id, stop_label_id, num_labels, max_seq_length, batch_size, device):
+      
+        super(BERT_CRF_NER, self).__init__()
+        self.hidden_size = 768
+        self.start_label_id = start_label_id
+        self.stop_label_id = stop_label_id
+        self.num_labels = num_labels
+        self.max_seq_length = max_seq_length
+        self.batch_size = batch_size
+        self.device=device
+
+        # use pretrainded BertModel 
+        self.bert = bert_model
+        self.dropout = torch.nn.Dropout(0.2)
+        # Maps the output of the bert into label space.
+        self.hidden2label = nn.Linear(self.hidden_size, self.num_labels)
+
+        # CRF layer on top of the emission scores, scripted so the per-step loops run without Python overhead
+        self.crf = torch.jit.script(CRF(self.num_labels, start_label_id, stop_label_id))
+
+        nn.init.xavier_uniform_(self.hidden2label.weight)
+        nn.init.constant_(self.hidden2label.bias, 0.0)
+        # self.apply(self.init_bert_weights)
+
+    def init_bert_weights(self, module):
+
+        """ Initialize the weights.
+        """
+        if isinstance(module, (nn.Linear, nn.Embedding)): 
+            # Slightly different from the TF version which uses truncated_normal for initialization
+            # cf https://github.com/pytorch/pytorch/pull/5617
+            module.weight.data.normal_(mean=0.0, std=self.config.initializer_range)
+        elif isinstance(module, BertLayerNorm):
+            module.bias.data.zero_()
+            module.weight.data.fill_(1.0)
+        if isinstance(module, nn.Linear) and module.bias is not None:
+            module.bias.data.zero_()
+
+    def _get_bert_features(self, input_ids, segment_ids, input_mask, return_cls=False):
+        '''
+        sentances -> word embedding -> lstm -> MLP -> feats
+        with `return_cls` also the last layer output at [CLS], one embedding per sentence
+        '''
+        bert_seq_out, _ = self.bert(input_ids, token_type_ids=segment_ids, attention_mask=input_mask, output_all_encoded_layers=False)
+        cls_embeddings = bert_seq_out[:, 0]
+        bert_seq_out = self.dropout(bert_seq_out)
+        bert_feats = self.hidden2label(bert_seq_out)
+        if return_cls:
+            return bert_feats, cls_embeddings
+        return bert_feats
+
+    def neg_log_likelihood(self, input_ids, segment_ids, input_mask, label_ids):
+
+        bert_feats = self._get_bert_features(input_ids, segment_ids, input_mask)
+        return self.crf.neg_log_likelihood(bert_feats, label_ids, input_mask)
+
+    # this forward is just for predict, not for train
+    # dont confuse this with CRF.forward_alg.
+    def forward(self, input_ids, segment_ids, input_mask):
+      
+        confidence, label_seq_ids, _, _ = self.decode(input_ids, segment_ids, input_mask)
+        return confidence, label_seq_ids
+
+    def decode(self, input_ids, segment_ids, input_mask, marginals=False, embeddings=False):
+        '''
+        forward() plus, when `marginals` is set, the CRF marginals of every position and, when `embeddings` is set,
+        the [CLS] embedding of every sentence, both from the same encoder pass (None otherwise)
+        '''
+        # Get the emission scores from the BiLSTM
+        bert_feats, cls_embeddings = self._get_bert_features(input_ids, segment_ids, input_mask, return_cls=True)
+        # Find the best path, given the features.
+        path_score, label_probs, label_seq_ids = self.crf.viterbi_decode(bert_feats, input_mask)
+        # (batch_size, 3) SE, NLC and Margin scores of every sentence, columns in crf.CONFIDENCE_COLUMNS
+        confidence = self.crf.confidence(label_probs, input_mask)
+        token_marginals = self.crf.marginals(bert_feats, input_mask) if marginals else None
+        return confidence, label_seq_ids, token_marginals, cls_embeddings if embeddings else None
+
+    def window_features(self, input_ids, stride):
+        '''
+        (1, T, num_labels) emission scores of one sentence (input_ids: (T,), [CLS] ... [SEP]) longer than max_seq_length.
+        The sub-words between [CLS] and [SEP] are encoded in windows of max_seq_length - 2 starting every `stride`,
+        each with its own [CLS] and [SEP], in one batch; positions covered by several windows get their mean score.
+        A stride over max_seq_length - 2 would leave sub-words out of every window and is cut down to it.
+        '''
+        inner = input_ids[1:-1]
+        n = len(inner)
+        width = self.max_seq_length - 2
+        stride = min(stride, width)
+        starts = list(range(0, max(n - width, 0), stride)) + [max(n - width, 0)]
+        windows = torch.stack([torch.cat([input_ids[:1], inner[s:s + width], input_ids[-1:]]) for s in starts])
+        feats = self._get_bert_features(windows, torch.zeros_like(windows), torch.ones_like(windows))
+        merged = feats.new_zeros((n + 2, self.num_labels))
+        counts = feats.new_zeros((n + 2, 1))
+        for k, s in enumerate(starts):
+            length = min(width, n - s)
+            merged[1 + s:1 + s + length] += feats[k, 1:1 + length]
+            counts[1 + s:1 + s + length] += 1
+        # [CLS] from the first window, [SEP] from the last one
+        merged[0] = feats[0, 0]
+        merged[-1] = feats[-1, min(width, n) + 1]
+        counts[0] = counts[-1] = 1
+        return (merged / counts).unsqueeze(0)
+
+    def decode_windows(self, input_ids, stride):
+        '''
+        forward() of one sentence of any length, encoded with window_features and decoded by the CRF as a whole
+        '''
+        bert_feats = self.window_features(input_ids, stride)
+        input_mask = torch.ones(bert_feats.shape[:2], dtype=torch.long, device=bert_feats.device)
+        path_score, label_probs, label_seq_ids = self.crf.viterbi_decode(bert_feats, input_mask)
+        return self.crf.confidence(label_probs, input_mask), label_seq_ids
+
+def restore_checkpoint(model, checkpoint_file):
+    '''
+    Loads the weights of a ner_bert_crf_checkpoint.pt into `model` and returns the checkpoint
+    '''
+    checkpoint = torch.load(checkpoint_file, map_location='cpu')
+    pretrained_dict=checkpoint['model_state']
+    # checkpoints written before the CRF layer was split out keep transitions at the top level
+    if 'transitions' in pretrained_dict:
+        pretrained_dict['crf.transitions'] = pretrained_dict.pop('transitions')
+    net_state_dict = model.state_dict()
+    pretrained_dict_selected = {k: v for k, v in pretrained_dict.items() if k in net_state_dict}
+    net_state_dict.update(pretrained_dict_selected)
+    model.load_state_dict(net_state_dict)
+    return checkpoint
+
+
+def save_checkpoint(model, checkpoint_file, epoch, valid_acc, valid_f1, round_th):
+    '''
+    `round_th` is the number of selection rounds in the labeled set the model was trained on
+    '''
+    torch.save({'epoch': int(epoch), 'model_state': model.state_dict(), 'valid_acc': float(valid_acc),
+                'valid_f1': float(valid_f1), 'round': int(round_th)}, checkpoint_file)
+
+
+def load_model(checkpoint_file, bert_model_scale, max_seq_length=180, batch_size=8):
+    '''
+    BERT_CRF_NER over the CoNLLDataProcessor labels with the weights of `checkpoint_file`, on `device`
+    and in eval mode, for inference
+    '''
+    processor = CoNLLDataProcessor()
+    model = BERT_CRF_NER(BertModel.from_pretrained(bert_model_scale), processor.get_start_label_id(),
+                         processor.get_stop_label_id(), len(processor.get_labels()), max_seq_length, batch_size, device)
+    restore_checkpoint(model, checkpoint_file)
+    return model.to(device).eval()
+
+
+def quantize_model(model):
+    '''
+    int8 copy of a BERT_CRF_NER for CPU inference: every nn.Linear, those of the BertModel and hidden2label,
+    is dynamically quantized (int8 weights, activations quantized per batch), the CRF stays in float
+    '''
+    return torch.quantization.quantize_dynamic(model.cpu().eval(), {nn.Linear}, dtype=torch.qint8, inplace=False)
+
+
+def compare_models(models, predict_dataloader, label_list, output_dir=None):
+    '''
+    Accuracy versus latency of each of `models` ({name: model}, e.g. float and int8) decoding the same data,
+    printed and, with `output_dir`, written to <output_dir>/quantization_report.tsv
+    '''
+    num_sentences = len(predict_dataloader.dataset)
+    rows = []
+    for name, model in models.items():
+        start = time.time()
+        _, _, all_preds, all_labels = score_pool(model, predict_dataloader, 'SE', label_list, torch.device('cpu'),
+                                                 0, False)
+        spent = time.time() - start
+        precision, recall, f1 = f1_score(all_labels, all_preds)
+        rows.append((name, num_sentences, 1000.*spent/num_sentences, num_sentences/spent,
+                     float((all_preds == all_labels).mean()), f1))
+    lines = ['model\tsentences\tms_per_sentence\tsentences_per_s\tacc\tf1']
+    lines += ['%s\t%d\t%.3f\t%.1f\t%.4f\t%.4f' % row for row in rows]
+    print('\n'.join(lines))
+    if output_dir is not None:
+        with open(os.path.join(output_dir, 'quantization_report.tsv'), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+    return rows
+
+
+def warmup_linear(x, warmup=0.002):
+    if x < warmup:
+        return x/warmup
+    return max(1.0 - x, 0.0)
+
+def train_epochs(model, optimizer, train_dataloader, start_epoch, total_train_epochs, steps_per_epoch,
+                 learning_rate0, warmup_proportion=0.1, gradient_accumulation_steps=1):
+    '''
+    Trains `model` from epoch `start_epoch` up to `total_train_epochs`, with the warm up schedule BERT uses
+    '''
+    total_train_steps = int(steps_per_epoch / gradient_accumulation_steps * total_train_epochs)
+    global_step_th = int(steps_per_epoch / gradient_accumulation_steps * start_epoch)
+    for epoch in range(start_epoch, total_train_epochs):
+        tr_loss = 0
+        tr_tokens = 0
+        tr_padded_tokens = 0
+        train_start = time.time()
+        model.train()
+        optimizer.zero_grad()
+        # for step, batch in enumerate(tqdm(train_dataloader, desc="Iteration")):
+        for step, batch in enumerate(train_dataloader):
+            tr_tokens += int(batch[1].sum())
+            tr_padded_tokens += batch[1].numel()
+            batch = tuple(t.to(device) for t in batch)
+            input_ids, input_mask, segment_ids, predict_mask, label_ids = batch
+
+            neg_log_likelihood = model.neg_log_likelihood(input_ids, segment_ids, input_mask, label_ids)
+            if gradient_accumulation_steps > 1:
+                neg_log_likelihood = neg_log_likelihood / gradient_accumulation_steps
+            neg_log_likelihood.backward()
+            tr_loss += neg_log_likelihood.item()
+            if (step + 1) % gradient_accumulation_steps == 0:
+                # modify learning rate with special warm up BERT uses
+                lr_this_step = learning_rate0 * warmup_linear(global_step_th/total_train_steps, warmup_proportion)
+                for param_group in optimizer.param_groups:
+                    param_group['lr'] = lr_this_step
+                optimizer.step()
+                optimizer.zero_grad()
+                global_step_th += 1
+                    
+        print('--------------------------------------------------------------')
+        train_time = time.time() - train_start
+        print("Epoch:{} completed, Total training's Loss: {}, Spend: {}m".format(epoch, tr_loss, train_time/60.0))
+        print("Tokens/s: {:.1f}, padding: {:.1f}% of {} batch tokens".format(
+            tr_tokens/train_time, 100.*(tr_padded_tokens - tr_tokens)/max(tr_padded_tokens, 1), tr_padded_tokens))
+
+def make_dataloader(dataset, lengths, batch_size, shuffle, bucket_size=100, max_tokens=0):
+    '''
+    DataLoader over `dataset` (e.g. a data.Subset of the corpus), `lengths` are the feature lengths of its items
+    '''
+    if bucket_size > 0 or max_tokens > 0:
+        # sentences of similar length share a batch, shuffled within buckets for training, sorted for the pool
+        batching = dict(batch_sampler=BucketBatchSampler(lengths, batch_size, shuffle, max(bucket_size, 1), max_tokens))
+    else:
+        batching = dict(batch_size=batch_size, shuffle=shuffle)
+    return data.DataLoader(dataset=dataset,
+                           num_workers=4,
+                           collate_fn=NerDataset.pad,
+                           **batching)
+
+def evaluate(model, predict_dataloader, batch_size, epoch_th, dataset_name, pool, pool_ids,
+             strategies='SE', label_list=None, output_dir=None, num_select=506, diversity=0, num_processes=0):
+    '''
+    Scores the pool with every strategy in one pass (see acquisition.py) and moves the `num_select` least
+    confident sentences of the first one to the labeled set of `pool` (pool.ActiveLearningPool), or with
+    `diversity` > 1 a diverse `num_select` of its `diversity * num_select` least confident ones.
+    On CPU, `num_processes` > 1 shards the scoring across that many processes.
+    `pool_ids` are the corpus ids of the sentences of predict_dataloader, in dataset order.
+    '''
+    strategies = get_acquisition(strategies)
+    start = time.time()
+    # predict_dataloader may only cover a subsample of the pool, see ActiveLearningPool.sample_pool
+    subsampled = len(pool_ids) < len(pool.unlabeled_ids())
+    compare = output_dir is not None and len(strategies) > 1
+    # the scores of the whole pool are only kept to be saved when several strategies are compared,
+    # or to be cached when the pool is subsampled
+    keep_scores = compare or subsampled
+    scores, selected, all_preds, all_labels = score_pool(model, predict_dataloader, strategies, label_list, device,
+                                                         num_select, keep_scores, diversity, num_processes)
+    if compare:
+        np.savez(os.path.join(output_dir, 'pool_scores.npz'), ids=pool_ids, **scores)
+    total = len(all_labels)
+    correct = int((all_preds == all_labels).sum())
+
+    test_acc = correct/total
+    precision, recall, f1 = f1_score(all_labels, all_preds)
+    end = time.time()
+    print('Epoch:%d, Acc:%.2f, Precision: %.2f, Recall: %.2f, F1: %.2f on %s, Spend:%.3f minutes for evaluation' \
+        % (epoch_th, 100.*test_acc, 100.*precision, 100.*recall, 100.*f1, dataset_name,(end-start)/60.0))
+    print('--------------------------------------------------------------')
+    # least confident first, only the ids move, the sentences and their features stay where they are
+    selected_ids, selected_scores = selected[strategies[0]]
+    selected_ids = pool_ids[selected_ids]
+    if subsampled:
+        pool.update_scores(pool_ids, scores[strategies[0]])
+        # diverse selection needs the embeddings, which only the rescored sentences have
+        if diversity <= 1:
+            selected_ids, selected_scores = pool.least_confident(num_select)
+    round_th = pool.select(selected_ids, strategies[0], selected_scores)
+    print('Round %d: moved %d sentences to the labeled set, %d left in the pool' % (
+        round_th, len(selected_ids), len(pool.unlabeled_ids())))
+    return test_acc, f1
+
+
+def main(strategy='SE'):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_dir",
+                        default=None,
+                        type=str,
+                        required=True,
+                        help="The input data dir.")
+    
+    parser.add_argument("--bert_model_scale", default='bert-base-multilingual-cased', type=str, required=True,
+                        help="Bert pre-trained model selected in the list: bert-base-uncased, "
+                        "bert-large-uncased, bert-base-cased, bert-large-cased, bert-base-multilingual-uncased, "
+                        "bert-base-multilingual-cased, bert-base-chinese.")
+    parser.add_argument("--batch_size",
+                        default=8,
+                        type=int,
+                        required=True,
+                        help="Batch size for training.")
+    
+    parser.add_argument("--max_seq_length",
+                        default=180,
+                        type=int,
+                        required=True,
+                        help="Max sequence length.")    
+     
+    parser.add_argument("--learning_rate",
+                        default=5e-5,
+                        type=float,
+                        required=True,
+                        help="Learning rate.")
+
+    parser.add_argument("--output_dir",
+                        default=None,
+                        type=str,
+                        required=True,
+                        help="The output directory where the model predictions and checkpoints will be written.")
+
+    parser.add_argument("--strategy",
+                        default=strategy,
+                        type=str,
+                        help="Acquisition function(s), comma separated, scored in one pass over the pool; the first "
+                        "selects. Choose from: " + ", ".join(ACQUISITION_FUNCTIONS) + ".")
+
+    parser.add_argument("--num_select",
+                        default=506,
+                        type=int,
+                        help="Sentences moved from the pool to the training set per round.")
+
+    parser.add_argument("--diversity",
+                        default=0,
+                        type=int,
+                        help="Select --num_select diverse sentences ([CLS] core-set) among the diversity * num_select "
+                        "least confident ones, 0 ranks by confidence alone.")
+
+    parser.add_argument("--pool_sample",
+                        default=0,
+                        type=int,
+                        help="Pool sentences rescored per round, stalest scores first; the others keep their cached "
+                        "scores. 0 rescores the whole pool.")
+
+    parser.add_argument("--refresh_every",
+                        default=0,
+                        type=int,
+                        help="With --pool_sample, rescore the whole pool every this many rounds, 0 never forces it.")
+
+    parser.add_argument("--scoring_processes",
+                        default=0,
+                        type=int,
+                        help="On CPU, score the pool in this many forked single-threaded processes sharing the model weights, "
+                        "typically one per core, 0 scores it in this process.")
+
+    parser.add_argument("--quantize",
+                        default='none',
+                        choices=['none', 'int8'],
+                        type=str,
+                        help="int8: score the pool on CPU with a dynamically quantized copy of the trained model.")
+
+    parser.add_argument("--quantization_report",
+                        action='store_true',
+                        help="With --quantize, compare accuracy and latency of the float and int8 models on the pool "
+                        "in the first round, written to <output_dir>/quantization_report.tsv.")
+
+    parser.add_argument("--feature_cache_dir",
+                        default=None,
+                        type=str,
+                        help="Where tokenized features are cached between runs, defaults to <output_dir>/feature_cache.")
+
+    parser.add_argument("--bucket_size",
+                        default=100,
+                        type=int,
+                        help="Batches per length bucket when shuffling training data, 0 disables length bucketing.")
+
+    parser.add_argument("--max_tokens",
+                        default=0,
+                        type=int,
+                        help="Token budget (sentences * padded length) per training and pool batch instead of --batch_size, 0 disables.")
+
+    parser.add_argument("--dataset_backend",
+                        default='memory',
+                        choices=['memory', 'mmap'],
+                        type=str,
+                        help="memory: features as Python lists, mmap: features memory-mapped from the feature cache.")
+
+    parser.add_argument("--num_rounds",
+                        default=1,
+                        type=int,
+                        help="Acquisition rounds run in this process, each warm-started from the previous round's model.")
+
+    parser.add_argument("--round_epochs",
+                        default='20',
+                        type=str,
+                        help="Training epochs per round, comma separated, the last one repeats, e.g. 20,5.")
+
+    parser.add_argument("--normalization",
+                        default='none',
+                        type=str,
+                        help="Persian normalization of the words: none, default or comma separated tables out of "
+                        + ", ".join(NORMALIZATION_TABLES) + ".")
+    
+    args = parser.parse_args()
+    learning_rate0 = args.learning_rate
+    bert_model_scale = args.bert_model_scale
+    batch_size = args.batch_size
+    data_dir = args.data_dir
+    output_dir = args.output_dir
+    strategies = get_acquisition(args.strategy)
+    num_select = args.num_select
+    diversity = args.diversity
+    pool_sample = args.pool_sample
+    refresh_every = args.refresh_every
+    scoring_processes = args.scoring_processes
+    quantize = args.quantize
+    if quantize != 'none' and cuda_yes:
+        print('Quantized inference runs on CPU only, --quantize is ignored on', device)
+        quantize = 'none'
+    feature_cache_dir = args.feature_cache_dir or os.path.join(output_dir, 'feature_cache')
+    dataset_backend = args.dataset_backend
+    bucket_size = args.bucket_size
+    max_tokens = args.max_tokens
+    normalizer = get_normalizer(args.normalization)
+    normalization = str(normalizer) if normalizer is not None else ''
+    load_checkpoint = True
+    max_seq_length = args.max_seq_length 
+    lr0_crf_fc = 8e-5
+    weight_decay_finetune = 1e-5 #0.01
+    weight_decay_crf_fc = 5e-6 #0.005
+    num_rounds = args.num_rounds
+    round_epochs = [int(epochs) for epochs in args.round_epochs.split(',')]
+    gradient_accumulation_steps = 1
+    warmup_proportion = 0.1
+    do_lower_case = False    
+
+    #Prepare data set
+    np.random.seed(44)
+    torch.manual_seed(44)
+    if cuda_yes:
+        torch.cuda.manual_seed_all(44)
+    conllProcessor = CoNLLDataProcessor(normalizer)
+    label_list = conllProcessor.get_labels()
+    label_map = conllProcessor.get_label_map()
+
+    # same sub-words as BertTokenizer, through a trie over the vocab and memoized per word
+    tokenizer = FastBertTokenizer(BertTokenizer.from_pretrained(bert_model_scale, do_lower_case=do_lower_case))
+    # shared by both datasets, so sentences and words common to them are only tokenized once
+    feature_store = FeatureStore(tokenizer, label_map, max_seq_length)
+    train_file = os.path.join(data_dir, "train.txt")
+    test_file = os.path.join(data_dir, "valid.txt")
+    if normalizer is not None and not os.path.isdir(feature_store.cache_path(train_file, feature_cache_dir,
+                                                          bert_model_scale, do_lower_case, normalization)):
+        # reported once, when the feature cache is built; the raw words get a throwaway memo
+        word_counts = collections.Counter(word for input_file in (train_file, test_file)
+                                          for words, _ in conllProcessor._iter_data(input_file) for word in words)
+        for line in normalization_report(word_counts, normalizer, tokenizer, CachedTokenizer(tokenizer.tokenizer)):
+            print(line)
+    if dataset_backend == 'mmap':
+        # the files are read lazily and converted straight into the cache, only when it is missing, and the
+        # features are memory-mapped from there, so no InputExample is kept
+        train_dataset = ArrayNerDataset(feature_store.save_arrays(conllProcessor.iter_examples(train_file),
+                            feature_store.cache_path(train_file, feature_cache_dir, bert_model_scale, do_lower_case,
+                            normalization)))
+        test_dataset = ArrayNerDataset(feature_store.save_arrays(conllProcessor.iter_examples(test_file),
+                            feature_store.cache_path(test_file, feature_cache_dir, bert_model_scale, do_lower_case,
+                            normalization)))
+    else:
+        train_examples = conllProcessor.get_train_examples(data_dir)
+        test_examples = conllProcessor.get_test_examples(data_dir)
+        feature_store.load_or_save(train_examples, train_file, feature_cache_dir, bert_model_scale, do_lower_case,
+                            normalization)
+        feature_store.load_or_save(test_examples, test_file, feature_cache_dir, bert_model_scale, do_lower_case,
+                            normalization)
+        train_dataset = NerDataset(train_examples,tokenizer,label_map,max_seq_length,feature_store)
+        test_dataset = NerDataset(test_examples,tokenizer,label_map,max_seq_length,feature_store)
+    # one corpus, the initial training set followed by the pool, in which sentences are only moved by id
+    corpus = data.ConcatDataset([train_dataset, test_dataset])
+    corpus_lengths = np.concatenate([train_dataset.lengths(), test_dataset.lengths()])
+    os.makedirs(output_dir, exist_ok=True)
+    pool = ActiveLearningPool(len(train_dataset), len(corpus), os.path.join(output_dir, 'selection_log.tsv'))
+
+    start_label_id = conllProcessor.get_start_label_id()
+    stop_label_id = conllProcessor.get_stop_label_id()
+    bert_model = BertModel.from_pretrained(bert_model_scale)
+    model = BERT_CRF_NER(bert_model, start_label_id, stop_label_id, len(label_list), max_seq_length, batch_size, device)
+
+    checkpoint_file = os.path.join(output_dir, 'ner_bert_crf_checkpoint.pt')
+    if load_checkpoint and os.path.exists(checkpoint_file):
+        checkpoint = restore_checkpoint(model, checkpoint_file)
+        # a checkpoint saved before the last selection is only a warm start for the grown labeled set
+        start_epoch = checkpoint['epoch']+1 if checkpoint.get('round', pool.round) >= pool.round else 0
+        valid_acc_prev = checkpoint['valid_acc']
+        valid_f1_prev = checkpoint['valid_f1']
+        print('Loaded the pretrain NER_BERT_CRF model, epoch:',checkpoint['epoch'],'valid acc:', 
+                checkpoint['valid_acc'], 'valid f1:', checkpoint['valid_f1'])
+    else:
+        start_epoch = 0
+        valid_acc_prev = 0
+        valid_f1_prev = 0
+
+    model.to(device)
+
+    # the tokenizer, the features and the model stay loaded across rounds, every round after the first
+    # fine-tunes the previous round's weights on the grown labeled set
+    for round_th in range(num_rounds):
+        labeled_ids = pool.labeled_ids()
+        pool_ids = pool.sample_pool(pool_sample, refresh_every)
+        if len(pool_ids) == 0:
+            print('The pool is empty, stopping after %d rounds' % round_th)
+            break
+        total_train_epochs = round_epochs[min(round_th, len(round_epochs) - 1)]
+        round_start = time.time()
+        train_dataloader = make_dataloader(data.Subset(corpus, labeled_ids), corpus_lengths[labeled_ids], batch_size,
+                                           True, bucket_size, max_tokens)
+        test_dataloader = make_dataloader(data.Subset(corpus, pool_ids), corpus_lengths[pool_ids], batch_size,
+                                          False, bucket_size, max_tokens)
+
+        # with a token budget the number of sentences per batch varies, so count the batches instead
+        steps_per_epoch = len(labeled_ids) / batch_size if max_tokens == 0 else len(train_dataloader)
+        total_train_steps = int(steps_per_epoch / gradient_accumulation_steps * total_train_epochs)
+
+        print("***** Running training, round %d *****" % (pool.round + 1))
+        print("  Num examples = %d"% len(labeled_ids))
+        print("  Batch size = %s"% (batch_size if max_tokens == 0 else '<= %d tokens' % max_tokens))
+        print("  Num epochs = %d"% total_train_epochs)
+        print("  Num steps = %d"% total_train_steps)
+        print("  Pool sentences scored = %d of %d"% (len(pool_ids), len(pool.unlabeled_ids())))
+
+        # Prepare optimizer
+        param_optimizer = list(model.named_parameters())
+        no_decay = ['bias', 'LayerNorm.bias', 'LayerNorm.weight']
+        new_param = ['crf.transitions', 'hidden2label.weight', 'hidden2label.bias']
+        optimizer_grouped_parameters = [
+            {'params': [p for n, p in param_optimizer if not any(nd in n for nd in no_decay) \
+                and not any(nd in n for nd in new_param)], 'weight_decay': weight_decay_finetune},
+            {'params': [p for n, p in param_optimizer if any(nd in n for nd in no_decay) \
+                and not any(nd in n for nd in new_param)], 'weight_decay': 0.0},
+            {'params': [p for n, p in param_optimizer if n in ('crf.transitions','hidden2label.weight')] \
+                , 'lr':lr0_crf_fc, 'weight_decay': weight_decay_crf_fc},
+            {'params': [p for n, p in param_optimizer if n == 'hidden2label.bias'] \
+                , 'lr':lr0_crf_fc, 'weight_decay': 0.0}
+        ]
+        optimizer = BertAdam(optimizer_grouped_parameters, lr=learning_rate0, warmup=warmup_proportion, t_total=total_train_steps)
+
+        train_epochs(model, optimizer, train_dataloader, start_epoch, total_train_epochs, steps_per_epoch,
+                     learning_rate0, warmup_proportion, gradient_accumulation_steps)
+        # only the first round resumes from the checkpoint's epoch
+        start_epoch = 0
+
+        scoring_model = model
+        if quantize == 'int8':
+            # training goes on with the float weights, the pool is scored with an int8 copy of them
+            scoring_model = quantize_model(model)
+            if args.quantization_report and round_th == 0:
+                compare_models({'float': model, 'int8': scoring_model}, test_dataloader, label_list, output_dir)
+        test_acc, f1 = evaluate(scoring_model, test_dataloader, batch_size, total_train_epochs, 'Test_set', pool, pool_ids,
+                                strategies, label_list, output_dir, num_select, diversity, scoring_processes)
+        # the model trained on the labeled set before this round's selection
+        save_checkpoint(model, checkpoint_file, total_train_epochs - 1, test_acc, f1, pool.round - 1)
+        # one line per round: round, labeled sentences it trained on, pool accuracy and F1, minutes
+        with open(os.path.join(output_dir, 'rounds.tsv'), 'a') as f:
+            f.write('%d\t%d\t%.4f\t%.4f\t%.3f\n' % (pool.round, len(labeled_ids), test_acc, f1,
+                                                   (time.time() - round_start)/60.0))
+
+if __name__ == "__main__":
+    main()
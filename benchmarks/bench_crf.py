@@ -0,0 +1,126 @@
+'''
+Micro-benchmark of the CRF layer (crf.py) on random emission scores, eager and torch.jit.script-ed,
+against the per-time-step loops BERT_CRF_NER used before.
+
+python benchmarks/bench_crf.py --max_seq_length=180 --batch_size=8
+'''
+import os
+import sys
+import time
+import argparse
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from crf import CRF
+
+
+def log_sum_exp_batch(log_Tensor, axis=-1): # shape (batch_size,n,m)
+    return torch.max(log_Tensor, axis)[0]+torch.log(torch.exp(log_Tensor-torch.max(log_Tensor, axis)[0].view(log_Tensor.shape[0],-1,1)).sum(axis))
+
+
+def forward_alg_loop(model, feats):
+    '''
+    the unmasked forward recursion BERT_CRF_NER._forward_alg used before, kept as the baseline
+    '''
+    T = feats.shape[1]
+    batch_size = feats.shape[0]
+    log_alpha = torch.Tensor(batch_size, 1, model.num_labels).fill_(-10000.).to(feats.device)
+    log_alpha[:, 0, model.start_label_id] = 0
+    for t in range(1, T):
+        log_alpha = (log_sum_exp_batch(model.transitions + log_alpha, axis=-1) + feats[:, t]).unsqueeze(1)
+    return log_sum_exp_batch(log_alpha)
+
+
+def score_sentence_loop(model, feats, label_ids):
+    '''
+    the per-time-step gold path score BERT_CRF_NER._score_sentence used before, kept as the baseline
+    '''
+    T = feats.shape[1]
+    batch_size = feats.shape[0]
+    batch_transitions = model.transitions.expand(batch_size, model.num_labels, model.num_labels).flatten(1)
+    score = torch.zeros((batch_size, 1))
+    for t in range(1, T):
+        score = score + \
+            batch_transitions.gather(-1, (label_ids[:, t]*model.num_labels+label_ids[:, t-1]).view(-1,1)) \
+                + feats[:, t].gather(-1, label_ids[:, t].view(-1,1)).view(-1,1)
+    return score
+
+
+def viterbi_decode_loop(model, feats):
+    '''
+    the unmasked decoder with a preallocated psi BERT_CRF_NER._viterbi_decode used before, kept as the baseline
+    '''
+    T = feats.shape[1]
+    batch_size = feats.shape[0]
+    log_delta = torch.Tensor(batch_size, 1, model.num_labels).fill_(-10000.)
+    log_delta[:, 0, model.start_label_id] = 0
+    psi = torch.zeros((batch_size, T, model.num_labels), dtype=torch.long)
+    for t in range(1, T):
+        log_delta, psi[:, t] = torch.max(model.transitions + log_delta, -1)
+        log_delta = (log_delta + feats[:, t]).unsqueeze(1)
+    path = torch.zeros((batch_size, T), dtype=torch.long)
+    a = torch.softmax(log_delta.squeeze(1), dim=1)
+    max_logLL_allz_allx, path[:, -1] = torch.max(a, -1)
+    for t in range(T-2, -1, -1):
+        path[:, t] = psi[:, t+1].gather(-1, path[:, t+1].view(-1,1)).squeeze(-1)
+    return (1/T)*max_logLL_allz_allx, path
+
+
+def timeit(fn, repeat):
+    fn()
+    start = time.time()
+    for _ in range(repeat):
+        fn()
+    return (time.time() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max_seq_length", default=180, type=int, help="Padded sequence length.")
+    parser.add_argument("--batch_size", default=8, type=int, help="Batch size.")
+    parser.add_argument("--num_labels", default=16, type=int, help="Size of the label set.")
+    parser.add_argument("--repeat", default=20, type=int, help="Timed repetitions per case.")
+    args = parser.parse_args()
+
+    torch.manual_seed(44)
+    model = CRF(args.num_labels, 1, 2)
+    scripted = torch.jit.script(model)
+    T = args.max_seq_length
+    feats = torch.randn(args.batch_size, T, args.num_labels, requires_grad=True)
+    # realistic mix of sentence lengths, padded to the batch maximum
+    lengths = torch.randint(T // 4, T + 1, (args.batch_size,))
+    lengths[0] = T
+    input_mask = (torch.arange(T).unsqueeze(0) < lengths.unsqueeze(1)).long()
+    label_ids = torch.randint(3, args.num_labels, (args.batch_size, T)) * input_mask
+
+    def run(fn):
+        def step():
+            model.zero_grad()
+            fn().sum().backward()
+        return step
+
+    cases = [
+        ('forward_alg loop (baseline)', lambda: forward_alg_loop(model, feats)),
+        ('forward_alg masked', lambda: model.forward_alg(feats, input_mask)),
+        ('forward_alg scripted', lambda: scripted.forward_alg(feats, input_mask)),
+        ('score_sentence loop (baseline)', lambda: score_sentence_loop(model, feats, label_ids)),
+        ('score_sentence batched', lambda: model.score_sentence(feats, label_ids, input_mask)),
+        ('neg_log_likelihood scripted', lambda: scripted.neg_log_likelihood(feats, label_ids, input_mask)),
+    ]
+    print('batch_size=%d, max_seq_length=%d, num_labels=%d, threads=%d' % (
+        args.batch_size, T, args.num_labels, torch.get_num_threads()))
+    for name, fn in cases:
+        print('%-32s fwd %8.3f ms   fwd+bwd %8.3f ms' % (name, timeit(fn, args.repeat), timeit(run(fn), args.repeat)))
+
+    decode_cases = [
+        ('viterbi_decode loop (baseline)', lambda: viterbi_decode_loop(model, feats)),
+        ('viterbi_decode masked', lambda: model.viterbi_decode(feats, input_mask)),
+        ('viterbi_decode scripted', lambda: scripted.viterbi_decode(feats, input_mask)),
+    ]
+    with torch.no_grad():
+        for name, fn in decode_cases:
+            print('%-32s decode %8.3f ms' % (name, timeit(fn, args.repeat)))
+
+
+if __name__ == "__main__":
+    main()
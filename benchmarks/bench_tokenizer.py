@@ -0,0 +1,58 @@
+'''
+Tokenization of the words of an IOB file (e.g. train.txt) with BertTokenizer.tokenize per word, as example2feature
+used to, against the memoizing CachedTokenizer and the trie based FastBertTokenizer, checking they agree.
+
+python benchmarks/bench_tokenizer.py --input_file=./input/train.txt --bert_model_scale="bert-base-multilingual-cased"
+'''
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pytorch_pretrained_bert.tokenization import BertTokenizer
+from features import CachedTokenizer
+from fast_tokenizer import FastBertTokenizer
+
+
+def read_words(input_file):
+    with open(input_file, encoding='utf-8') as f:
+        return [line.split()[0] for line in f if line.split()]
+
+
+def timeit(tokenizer, words):
+    start = time.time()
+    sub_words = [tokenizer.tokenize(word) for word in words]
+    return time.time() - start, sub_words
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_file", default=None, type=str, required=True, help="An IOB file.")
+    parser.add_argument("--bert_model_scale", default='bert-base-multilingual-cased', type=str, help="Vocab to use.")
+    parser.add_argument("--do_lower_case", action='store_true', help="Lower case the words.")
+    args = parser.parse_args()
+
+    words = read_words(args.input_file)
+    bert_tokenizer = BertTokenizer.from_pretrained(args.bert_model_scale, do_lower_case=args.do_lower_case)
+    start = time.time()
+    fast_tokenizer = FastBertTokenizer(bert_tokenizer)
+    print('%d words, %d distinct, FastBertTokenizer built in %.3fs' % (len(words), len(set(words)), time.time() - start))
+
+    baseline, expected = timeit(bert_tokenizer, words)
+    print('%-32s %8.3fs' % ('BertTokenizer.tokenize', baseline))
+    for name, tokenizer in (('CachedTokenizer', CachedTokenizer(bert_tokenizer)), ('FastBertTokenizer', fast_tokenizer)):
+        cold, sub_words = timeit(tokenizer, words)
+        warm, _ = timeit(tokenizer, words)
+        print('%-32s %8.3fs (x%.1f), warm %8.3fs (x%.1f), same sub-words: %s' % (
+            name, cold, baseline / cold, warm, baseline / warm, sub_words == expected))
+    # the distinct words only, where memoizing does not help and the trie does all the work
+    distinct = list(set(words))
+    baseline, expected = timeit(bert_tokenizer, distinct)
+    cold, sub_words = timeit(FastBertTokenizer(bert_tokenizer), distinct)
+    print('%-32s %8.3fs (x%.1f), same sub-words: %s' % (
+        'FastBertTokenizer, distinct', cold, baseline / cold, sub_words == expected))
+
+
+if __name__ == "__main__":
+    main()
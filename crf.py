@@ -0,0 +1,172 @@
+from typing import Tuple
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+# columns of CRF.confidence, by the active-learning strategy that ranks the pool with them
+CONFIDENCE_COLUMNS = {'SE': 0, 'NLC': 1, 'Margin': 2}
+
+
+class CRF(nn.Module):
+    '''
+    Linear-chain CRF over the emission scores (feats) of an encoder, shared by all the run_*.py entry points.
+    It is written to compile with torch.jit.script, so it can be scripted on its own or exported with the encoder;
+    neg_log_likelihood (training) and viterbi_decode (prediction) are exported on the scripted module.
+
+    feats: (batch_size, T, num_labels), input_mask: (batch_size, T) with 1 for real positions.
+    The 0th position is [CLS] (start_label_id) and the last real position is [SEP] (stop_label_id).
+    '''
+
+    def __init__(self, num_labels: int, start_label_id: int, stop_label_id: int):
+
+        super(CRF, self).__init__()
+        self.num_labels = num_labels
+        self.start_label_id = start_label_id
+        self.stop_label_id = stop_label_id
+
+        # Matrix of transition parameters.  Entry i,j is the score of transitioning *to* i *from* j.
+        self.transitions = nn.Parameter(
+            torch.randn(self.num_labels, self.num_labels))
+
+        # These two statements enforce the constraint that we never transfer *to* the start tag(or label),
+        # and we never transfer *from* the stop label (the model would probably learn this anyway,
+        # so this enforcement is likely unimportant)
+        self.transitions.data[start_label_id, :] = -10000
+        self.transitions.data[:, stop_label_id] = -10000
+
+    def forward_alg(self, feats: torch.Tensor, input_mask: torch.Tensor) -> torch.Tensor:
+        '''
+        this also called alpha-recursion or forward recursion, to calculate log_prob of all barX
+        padded positions (input_mask==0) keep alpha unchanged, so every sequence stops at its real length
+        '''
+
+        T = feats.shape[1]
+        batch_size = feats.shape[0]
+        # (batch_size, T, 1), broadcast against (batch_size, num_labels) at each step
+        mask = (input_mask != 0).unsqueeze(-1)
+        # alpha_recursion,forward, alpha(zt)=p(zt,bar_x_1:t)
+        # self.start_label has all of the score. it is log,0 is p=1
+        log_alpha = feats.new_full((batch_size, self.num_labels), -10000.)
+        log_alpha[:, self.start_label_id] = 0
+
+        for t in range(1, T):
+            # transitions[i, j] is j -> i, so alpha is broadcast over the "from" axis
+            next_alpha = torch.logsumexp(self.transitions + log_alpha.unsqueeze(1), dim=-1) + feats[:, t]
+            log_alpha = torch.where(mask[:, t], next_alpha, log_alpha)
+
+        # log_prob of all barX
+        return torch.logsumexp(log_alpha, dim=-1, keepdim=True)
+
+    def score_sentence(self, feats: torch.Tensor, label_ids: torch.Tensor, input_mask: torch.Tensor) -> torch.Tensor:
+        '''
+        Gives the score of a provided label sequence
+        p(X=w1:t,Zt=tag1:t)=...p(Zt=tag_t|Zt-1=tag_t-1)p(xt|Zt=tag_t)...
+        all positions are scored at once, padded positions (input_mask==0) are masked out
+        '''
+
+        # the 0th node is start_label->start_word, the probability of them=1. so t begin with 1.
+        mask = input_mask[:, 1:].to(feats.dtype)
+        # transitions[i, j] is j -> i, indexed with (tag_t, tag_t-1) for every t at once
+        trans_score = self.transitions[label_ids[:, 1:], label_ids[:, :-1]]
+        emit_score = feats[:, 1:].gather(-1, label_ids[:, 1:].unsqueeze(-1)).squeeze(-1)
+        return ((trans_score + emit_score) * mask).sum(1, keepdim=True)
+
+    @torch.jit.export
+    def neg_log_likelihood(self, feats: torch.Tensor, label_ids: torch.Tensor, input_mask: torch.Tensor) -> torch.Tensor:
+        forward_score = self.forward_alg(feats, input_mask)
+        gold_score = self.score_sentence(feats, label_ids, input_mask)
+        # - log[ p(X=w1:t,Zt=tag1:t)/p(X=w1:t) ] = - log[ p(Zt=tag1:t|X=w1:t) ]
+        return torch.mean(forward_score - gold_score)
+
+    @torch.jit.export
+    def viterbi_decode(self, feats: torch.Tensor, input_mask: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        '''
+        Max-Product Algorithm or viterbi algorithm, argmax(p(z_0:t|x_0:t))
+        each sequence is decoded up to its real length (input_mask), padded positions of the path are 0 (X).
+        returns the unnormalized best path score, the softmax over the final deltas and the best path
+        '''
+
+        T = feats.shape[1]
+        batch_size = feats.shape[0]
+        log_delta = feats.new_full((batch_size, self.num_labels), -10000.)
+        log_delta[:, self.start_label_id] = 0
+
+        # the recursion runs unmasked over the padded batch, the delta of each sequence is read back at its
+        # real last position, and psi is only masked once after the loop
+        all_delta = [log_delta]
+        # psi[t][k] is the path choosed from z_t-1 to z_t[k],the value is the z_state(is k) index of z_t-1
+        psi = []
+        for t in range(1, T):
+            # delta[t][k]=max_z1:t-1( p(x1,x2,...,xt,z1,z2,...,zt-1,zt=k|theta) )
+            log_delta, psi_t = torch.max(self.transitions + log_delta.unsqueeze(1), -1)
+            log_delta = log_delta + feats[:, t]
+            all_delta.append(log_delta)
+            psi.append(psi_t)
+
+        lengths = input_mask.sum(1)
+        log_delta = torch.stack(all_delta)[lengths - 1, torch.arange(batch_size, device=feats.device)]
+        # max p(z1:t,all_x|theta)
+        path_score, last_label = torch.max(log_delta, -1)
+        label_probs = F.softmax(log_delta, dim=-1)
+
+        # trace back, at padded positions the back pointer of state k is k itself so the path passes through
+        path = torch.zeros((batch_size, T), dtype=torch.long, device=feats.device)
+        path[:, T - 1] = last_label
+        if T > 1:
+            identity = torch.arange(self.num_labels, device=feats.device)
+            all_psi = torch.where((input_mask[:, 1:] != 0).t().unsqueeze(-1), torch.stack(psi), identity)
+            for t in range(T - 2, -1, -1):
+                # choose the state of z_t according the state choosed of z_t+1.
+                path[:, t] = all_psi[t].gather(-1, path[:, t + 1].unsqueeze(-1)).squeeze(-1)
+        path = path * input_mask
+
+        return path_score, label_probs, path
+
+    @torch.jit.export
+    def marginals(self, feats: torch.Tensor, input_mask: torch.Tensor) -> torch.Tensor:
+        '''
+        forward-backward algorithm, p(z_t=k|x) of every position, (batch_size, T, num_labels), 0 at padded positions
+        '''
+
+        T = feats.shape[1]
+        batch_size = feats.shape[0]
+        mask = (input_mask != 0).unsqueeze(-1)
+        log_alpha = feats.new_full((batch_size, self.num_labels), -10000.)
+        log_alpha[:, self.start_label_id] = 0
+        all_alpha = [log_alpha]
+        for t in range(1, T):
+            next_alpha = torch.logsumexp(self.transitions + log_alpha.unsqueeze(1), dim=-1) + feats[:, t]
+            log_alpha = torch.where(mask[:, t], next_alpha, log_alpha)
+            all_alpha.append(log_alpha)
+        log_z = torch.logsumexp(log_alpha, dim=-1, keepdim=True)
+
+        # beta(z_t)=p(bar_x_t+1:T|z_t), 0 at the last real position of each sequence and after it
+        log_beta = torch.zeros_like(log_alpha)
+        all_beta = [log_beta]
+        for t in range(T - 1, 0, -1):
+            # transitions.t()[j, k] is j -> k, summed over the next state k
+            next_beta = torch.logsumexp(self.transitions.t() + (feats[:, t] + log_beta).unsqueeze(1), dim=-1)
+            log_beta = torch.where(mask[:, t], next_beta, torch.zeros_like(next_beta))
+            all_beta.append(log_beta)
+        all_beta.reverse()
+
+        log_marginals = torch.stack(all_alpha, dim=1) + torch.stack(all_beta, dim=1) - log_z.unsqueeze(1)
+        return log_marginals.exp() * mask.to(feats.dtype)
+
+    @torch.jit.export
+    def confidence(self, label_probs: torch.Tensor, input_mask: torch.Tensor) -> torch.Tensor:
+        '''
+        (batch_size, 3) confidence of each decoded sentence from the softmax over its final deltas, lower is
+        less confident: sum p*log(p) (negative sequence entropy, SE), top probability normalized by the real
+        sequence length (NLC), and margin between the two most probable final labels (Margin).
+        '''
+
+        top2 = label_probs.topk(2, dim=-1)[0]
+        entropy = torch.where(label_probs > 0, label_probs * label_probs.log(), torch.zeros_like(label_probs)).sum(-1)
+        least_confidence = top2[:, 0] / input_mask.sum(1).to(label_probs.dtype)
+        margin = top2[:, 0] - top2[:, 1]
+        return torch.stack([entropy, least_confidence, margin], dim=1)
+
+    def forward(self, feats: torch.Tensor, input_mask: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        return self.viterbi_decode(feats, input_mask)
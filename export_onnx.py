@@ -0,0 +1,89 @@
+'''
+Exports a trained BERT_CRF_NER (ner_bert_crf_checkpoint.pt) for inference with onnx_tagger.OnnxTagger:
+the BertModel encoder and hidden2label, without dropout, to <export_dir>/emissions.onnx, and the CRF
+transitions with the label set to <export_dir>/crf.npz.
+
+python export_onnx.py --output_dir=./output --bert_model_scale="bert-base-multilingual-cased"
+'''
+import os
+import argparse
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+class EmissionScores(nn.Module):
+    '''
+    the encoder and emissions head of a BERT_CRF_NER, (batch_size, T, num_labels) emission scores
+    '''
+
+    def __init__(self, model):
+        super(EmissionScores, self).__init__()
+        self.bert = model.bert
+        self.hidden2label = model.hidden2label
+
+    def forward(self, input_ids, segment_ids, input_mask):
+        bert_seq_out, _ = self.bert(input_ids, token_type_ids=segment_ids, attention_mask=input_mask, output_all_encoded_layers=False)
+        return self.hidden2label(bert_seq_out)
+
+
+def export_onnx(model, label_list, export_dir, max_seq_length=180, opset_version=11):
+    os.makedirs(export_dir, exist_ok=True)
+    emissions = EmissionScores(model).cpu().eval()
+    # the TorchScript exporter, which takes dynamic_axes and opset_version as they are; batch size and sequence
+    # length are dynamic, the dummy batch only traces the graph
+    input_ids = torch.ones((2, max_seq_length), dtype=torch.long)
+    segment_ids = torch.zeros((2, max_seq_length), dtype=torch.long)
+    input_mask = torch.ones((2, max_seq_length), dtype=torch.long)
+    dynamic_axes = {name: {0: 'batch_size', 1: 'seq_length'} for name in ('input_ids', 'segment_ids', 'input_mask', 'emissions')}
+    with torch.no_grad():
+        torch.onnx.export(emissions, (input_ids, segment_ids, input_mask), os.path.join(export_dir, 'emissions.onnx'),
+                          input_names=['input_ids', 'segment_ids', 'input_mask'], output_names=['emissions'],
+                          dynamic_axes=dynamic_axes, opset_version=opset_version, dynamo=False)
+    np.savez(os.path.join(export_dir, 'crf.npz'),
+             transitions=model.crf.transitions.detach().cpu().numpy(),
+             start_label_id=model.start_label_id, stop_label_id=model.stop_label_id,
+             labels=np.array(label_list))
+    return emissions
+
+
+def main():
+    from active_learning import CoNLLDataProcessor, load_model
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default=None, type=str, required=True,
+                        help="The directory of ner_bert_crf_checkpoint.pt.")
+    parser.add_argument("--bert_model_scale", default='bert-base-multilingual-cased', type=str,
+                        help="The pre-trained Bert model the checkpoint was trained from.")
+    parser.add_argument("--max_seq_length", default=180, type=int, help="Max sequence length.")
+    parser.add_argument("--export_dir", default=None, type=str,
+                        help="Where emissions.onnx and crf.npz are written, defaults to <output_dir>/onnx.")
+    parser.add_argument("--opset_version", default=11, type=int, help="ONNX opset.")
+    args = parser.parse_args()
+    export_dir = args.export_dir or os.path.join(args.output_dir, 'onnx')
+
+    model = load_model(os.path.join(args.output_dir, 'ner_bert_crf_checkpoint.pt'), args.bert_model_scale,
+                       args.max_seq_length)
+    label_list = CoNLLDataProcessor().get_labels()
+    emissions = export_onnx(model, label_list, export_dir, args.max_seq_length, args.opset_version)
+    print('Exported to', export_dir)
+
+    # the exported graph and the numpy decoder against the torch model, when onnxruntime is installed
+    try:
+        from onnx_tagger import OnnxTagger
+        tagger = OnnxTagger(export_dir)
+    except ImportError:
+        return
+    input_ids = torch.randint(1, model.bert.embeddings.word_embeddings.num_embeddings, (4, 32))
+    input_mask = (torch.arange(32).unsqueeze(0) < torch.tensor([[32], [20], [7], [3]])).long()
+    segment_ids = torch.zeros_like(input_ids)
+    with torch.no_grad():
+        torch_feats = emissions(input_ids, segment_ids, input_mask).numpy()
+        _, torch_path = model.cpu()(input_ids, segment_ids, input_mask)
+    onnx_feats = tagger.emissions(input_ids.numpy(), segment_ids.numpy(), input_mask.numpy())
+    _, onnx_path = tagger(input_ids.numpy(), segment_ids.numpy(), input_mask.numpy())
+    print('Max emission difference: %.2e, same paths: %s' % (
+        np.abs(torch_feats - onnx_feats).max(), bool((torch_path.numpy() == onnx_path).all())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import unicodedata
+from pytorch_pretrained_bert.tokenization import _is_control, _is_punctuation, _is_whitespace
+from features import CachedTokenizer
+
+
+# what basic tokenization does with a character, see BasicTokenizer._clean_text, _tokenize_chinese_chars
+# and _run_split_on_punc
+_KEEP, _DROP, _SPACE, _CHINESE, _PUNCTUATION = 0, 1, 2, 3, 4
+
+# key of the piece ending at a trie node, no character is the empty string
+_PIECE = ''
+
+
+def _build_trie(pieces):
+    root = {}
+    for key, piece in pieces:
+        node = root
+        for char in key:
+            node = node.setdefault(char, {})
+        node[_PIECE] = piece
+    return root
+
+
+class FastBertTokenizer(CachedTokenizer):
+    '''
+    Drop-in for a BertTokenizer on pre-split words, e.g. in example2feature, giving the same sub-words and ids.
+    Basic tokenization classifies every distinct character once, WordPiece walks a trie of the vocab instead of
+    looking up every candidate substring, and the sub-words of every word are memoized (see CachedTokenizer).
+    With a `normalizer` (see normalization.get_normalizer) every word is normalized first, which changes the ids
+    of the words it rewrites; the training data is normalized by CoNLLDataProcessor instead.
+    '''
+
+    def __init__(self, tokenizer, normalizer=None):
+        super(FastBertTokenizer, self).__init__(tokenizer)
+        basic_tokenizer = tokenizer.basic_tokenizer if tokenizer.do_basic_tokenize else None
+        self.do_basic_tokenize = basic_tokenizer is not None
+        self.do_lower_case = basic_tokenizer is not None and basic_tokenizer.do_lower_case
+        self.never_split = set(basic_tokenizer.never_split) if basic_tokenizer is not None else set()
+        self.unk_token = tokenizer.wordpiece_tokenizer.unk_token
+        self.max_input_chars_per_word = tokenizer.wordpiece_tokenizer.max_input_chars_per_word
+        self.normalizer = normalizer
+        self._char_kinds = {}
+        self._initial = _build_trie((piece, piece) for piece in self.vocab if not piece.startswith('##'))
+        self._continuation = _build_trie((piece[2:], piece) for piece in self.vocab if piece.startswith('##'))
+
+    def _char_kind(self, char):
+        kind = self._char_kinds.get(char)
+        if kind is None:
+            cp = ord(char)
+            if cp == 0 or cp == 0xfffd or _is_control(char):
+                kind = _DROP
+            elif _is_whitespace(char):
+                kind = _SPACE
+            elif self.tokenizer.basic_tokenizer._is_chinese_char(cp):
+                kind = _CHINESE
+            elif _is_punctuation(char):
+                kind = _PUNCTUATION
+            else:
+                kind = _KEEP
+            self._char_kinds[char] = kind
+        return kind
+
+    def _clean(self, text):
+        # control characters dropped, whitespace to spaces, chinese characters between spaces
+        chars = []
+        for char in text:
+            kind = self._char_kind(char)
+            if kind == _SPACE:
+                chars.append(' ')
+            elif kind == _CHINESE:
+                chars.append(' %s ' % char)
+            elif kind != _DROP:
+                chars.append(char)
+        return ''.join(chars)
+
+    def _split_on_punctuation(self, token):
+        pieces = []
+        current = []
+        for char in token:
+            if self._char_kind(char) == _PUNCTUATION:
+                if current:
+                    pieces.append(''.join(current))
+                    current = []
+                pieces.append(char)
+            else:
+                current.append(char)
+        if current:
+            pieces.append(''.join(current))
+        return pieces
+
+    def basic_tokenize(self, text):
+        '''
+        BasicTokenizer.tokenize
+        '''
+        tokens = []
+        for token in self._clean(text).split():
+            if token in self.never_split:
+                tokens.append(token)
+                continue
+            if self.do_lower_case:
+                token = ''.join(char for char in unicodedata.normalize('NFD', token.lower())
+                                if unicodedata.category(char) != 'Mn')
+            tokens.extend(self._split_on_punctuation(token))
+        return ' '.join(tokens).split()
+
+    def wordpiece(self, token):
+        '''
+        WordpieceTokenizer.tokenize of one token, greedy longest-match-first over the vocab trie
+        '''
+        if len(token) > self.max_input_chars_per_word:
+            return [self.unk_token]
+        sub_tokens = []
+        trie = self._initial
+        start = 0
+        while start < len(token):
+            node = trie
+            piece = None
+            for i in range(start, len(token)):
+                node = node.get(token[i])
+                if node is None:
+                    break
+                if _PIECE in node:
+                    piece, end = node[_PIECE], i + 1
+            if piece is None:
+                return [self.unk_token]
+            sub_tokens.append(piece)
+            start = end
+            trie = self._continuation
+        return sub_tokens
+
+    def tokenize(self, word):
+        sub_words = self._sub_words.get(word)
+        if sub_words is None:
+            text = self.normalizer(word) if self.normalizer is not None else word
+            tokens = self.basic_tokenize(text) if self.do_basic_tokenize else text.split()
+            sub_words = self._sub_words[word] = [piece for token in tokens for piece in self.wordpiece(token)]
+        return sub_words
+
+    def convert_tokens_to_ids(self, tokens):
+        vocab = self.vocab
+        return [vocab[token] for token in tokens]
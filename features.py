@@ -0,0 +1,323 @@
+import os
+import array
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from torch.utils import data
+
+
+class InputFeatures(object):
+    """A single set of features of data.
+    result of convert_examples_to_features(InputExample)
+    """
+
+    def __init__(self, input_ids, input_mask, segment_ids,  predict_mask, label_ids):
+        self.input_ids = input_ids
+        self.input_mask = input_mask
+        self.segment_ids = segment_ids
+        self.predict_mask = predict_mask
+        self.label_ids = label_ids
+
+
+def example2feature(example, tokenizer, label_map, max_seq_length, truncate=True):
+    '''
+    Loads a data file into a list of `InputBatch`s.
+    with truncate=False longer sentences are kept whole, for BERT_CRF_NER.decode_windows
+    '''
+  
+    add_label = 'X'
+    tokens = ['[CLS]']
+    predict_mask = [0]
+    label_ids = [label_map['[CLS]']]
+    for i, w in enumerate(example.words):
+        # use bertTokenizer to split words
+        sub_words = tokenizer.tokenize(w)
+        if not sub_words:
+            sub_words = ['[UNK]']
+        # tokenize_count.append(len(sub_words))
+        tokens.extend(sub_words)
+        for j in range(len(sub_words)):
+            if j == 0:
+                predict_mask.append(1)
+                label_ids.append(label_map[example.labels[i]])
+            else:
+                # '##xxx' -> 'X' (see bert paper)
+                predict_mask.append(0)
+                label_ids.append(label_map[add_label])
+
+    # truncate
+    if truncate and len(tokens) > max_seq_length - 1:
+        print('Example No.{} is too long, length is {}, truncated to {}!'.format(example.guid, len(tokens), max_seq_length))
+        tokens = tokens[0:(max_seq_length - 1)]
+        predict_mask = predict_mask[0:(max_seq_length - 1)]
+        label_ids = label_ids[0:(max_seq_length - 1)]
+    tokens.append('[SEP]')
+    predict_mask.append(0)
+    label_ids.append(label_map['[SEP]'])
+
+    input_ids = tokenizer.convert_tokens_to_ids(tokens)
+    segment_ids = [0] * len(input_ids)
+    input_mask = [1] * len(input_ids)
+
+    feat=InputFeatures(
+                input_ids=input_ids,
+                input_mask=input_mask,
+                segment_ids=segment_ids,
+                predict_mask=predict_mask,
+                label_ids=label_ids)
+
+    return feat
+
+
+# flat arrays a list of features is stored as, with offsets.npy marking where each sentence starts.
+# input_mask and segment_ids are all ones and all zeros, so they are rebuilt from the lengths.
+FEATURE_ARRAYS = (('input_ids', np.int32), ('predict_mask', np.int8), ('label_ids', np.int16))
+
+
+def feature_cache_key(input_file, bert_model_scale, do_lower_case, max_seq_length, normalization=''):
+    '''
+    Name of the on-disk cache of `input_file`, changes with its content and with every tokenization setting,
+    including the word normalization tables (see normalization.PersianNormalizer).
+    '''
+    file_hash = hashlib.sha1()
+    with open(input_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            file_hash.update(chunk)
+    settings = '{}-{}-{}-{}'.format(file_hash.hexdigest(), bert_model_scale, do_lower_case, max_seq_length)
+    if normalization:
+        settings += '-' + normalization
+    return '{}-{}'.format(os.path.basename(input_file), hashlib.sha1(settings.encode('utf-8')).hexdigest()[:16])
+
+
+def save_feature_arrays(features, path):
+    '''
+    Writes `features` (any iterable, consumed once) to the directory `path` as flat .npy arrays plus offsets.
+    Values are streamed to raw files first, so memory stays bounded for corpora larger than RAM.
+    The directory is written under a temporary name and renamed, so readers never see a partial cache.
+    '''
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent)
+    offsets = array.array('q', [0])
+    raw_files = [open(os.path.join(tmp_path, name + '.bin'), 'wb') for name, _ in FEATURE_ARRAYS]
+    for feat in features:
+        for f, (name, dtype) in zip(raw_files, FEATURE_ARRAYS):
+            f.write(np.asarray(getattr(feat, name), dtype=dtype).tobytes())
+        offsets.append(offsets[-1] + len(feat.input_ids))
+    for f in raw_files:
+        f.close()
+
+    np.save(os.path.join(tmp_path, 'offsets.npy'), np.frombuffer(offsets, dtype=np.int64))
+    for name, dtype in FEATURE_ARRAYS:
+        raw_file = os.path.join(tmp_path, name + '.bin')
+        values = np.lib.format.open_memmap(os.path.join(tmp_path, name + '.npy'), mode='w+', dtype=dtype, shape=(offsets[-1],))
+        if offsets[-1] > 0:
+            raw = np.memmap(raw_file, dtype=dtype, mode='r')
+            for start in range(0, len(raw), 1 << 24):
+                values[start:start + (1 << 24)] = raw[start:start + (1 << 24)]
+            del raw
+        values.flush()
+        del values
+        os.remove(raw_file)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # another run wrote the same cache first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def load_feature_arrays(path, mmap_mode=None):
+    '''
+    Reads the arrays written by `save_feature_arrays`, memory-mapped when `mmap_mode` is given (e.g. 'r').
+    '''
+    arrays = {'offsets': np.load(os.path.join(path, 'offsets.npy'), mmap_mode=mmap_mode)}
+    for name, _ in FEATURE_ARRAYS:
+        arrays[name] = np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+    return arrays
+
+
+def arrays2features(arrays):
+    '''
+    Turns the arrays of `load_feature_arrays` back into a list of `InputFeatures`.
+    '''
+    offsets = arrays['offsets'].tolist()
+    values = {name: arrays[name].tolist() for name, _ in FEATURE_ARRAYS}
+    features = []
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        features.append(InputFeatures(
+                    input_ids=values['input_ids'][start:end],
+                    input_mask=[1] * (end - start),
+                    segment_ids=[0] * (end - start),
+                    predict_mask=values['predict_mask'][start:end],
+                    label_ids=values['label_ids'][start:end]))
+    return features
+
+
+class CachedTokenizer(object):
+    '''
+    Wraps a BertTokenizer and memoizes tokenize() per word, so each distinct word goes through
+    basic cleaning and WordPiece once instead of once per occurrence, epoch and active-learning round.
+    '''
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.vocab = tokenizer.vocab
+        self._sub_words = {}
+
+    def __len__(self):
+        return len(self._sub_words)
+
+    def tokenize(self, word):
+        sub_words = self._sub_words.get(word)
+        if sub_words is None:
+            sub_words = self._sub_words[word] = self.tokenizer.tokenize(word)
+        return sub_words
+
+    def convert_tokens_to_ids(self, tokens):
+        return self.tokenizer.convert_tokens_to_ids(tokens)
+
+
+class FeatureStore(object):
+    '''
+    `InputFeatures` of every sentence converted so far, keyed by its words and labels.
+    A sentence is converted once per process, also when it moves from the unlabeled pool to the training set.
+    '''
+
+    def __init__(self, tokenizer, label_map, max_seq_length):
+        if not isinstance(tokenizer, CachedTokenizer):
+            tokenizer = CachedTokenizer(tokenizer)
+        self.tokenizer = tokenizer
+        self.label_map = label_map
+        self.max_seq_length = max_seq_length
+        self._features = {}
+
+    def __len__(self):
+        return len(self._features)
+
+    def get(self, example):
+        key = (tuple(example.words), tuple(example.labels))
+        feat = self._features.get(key)
+        if feat is None:
+            feat = self._features[key] = example2feature(example, self.tokenizer, self.label_map, self.max_seq_length)
+        return feat
+
+    def cache_path(self, input_file, cache_dir, bert_model_scale, do_lower_case, normalization=''):
+        return os.path.join(cache_dir, feature_cache_key(input_file, bert_model_scale, do_lower_case, self.max_seq_length,
+                                                         normalization))
+
+    def save_arrays(self, examples, path):
+        '''
+        Streams the features of `examples` to the on-disk cache `path` unless it exists, without keeping them in the store.
+        '''
+        if not os.path.isdir(path):
+            save_feature_arrays((example2feature(example, self.tokenizer, self.label_map, self.max_seq_length)
+                                 for example in examples), path)
+        return path
+
+    def load_or_save(self, examples, input_file, cache_dir, bert_model_scale, do_lower_case, normalization=''):
+        '''
+        Fills the store with the features of `examples` (read from `input_file`) from the on-disk cache in
+        `cache_dir`, or converts them and writes the cache when there is none for this file and these settings.
+        '''
+        path = self.cache_path(input_file, cache_dir, bert_model_scale, do_lower_case, normalization)
+        if os.path.isdir(path):
+            features = arrays2features(load_feature_arrays(path))
+            if len(features) == len(examples):
+                for example, feat in zip(examples, features):
+                    self._features.setdefault((tuple(example.words), tuple(example.labels)), feat)
+                print('Loaded {} cached features from {}'.format(len(features), path))
+                return path
+            shutil.rmtree(path, ignore_errors=True)
+        save_feature_arrays([self.get(example) for example in examples], path)
+        return path
+
+
+class BucketBatchSampler(data.Sampler):
+    '''
+    Batches sentences of similar length together, so padding a batch to its longest member wastes little.
+    shuffle=True (training): every pass shuffles the sentences, sorts them by length within buckets of
+    batch_size * bucket_size sentences and shuffles the order of the resulting batches.
+    shuffle=False (evaluation, pool scoring): the batches follow one stable sort by length.
+    With max_tokens > 0 a batch takes sentences until its padded size (sentences * longest length) would
+    exceed max_tokens, instead of a fixed batch_size; a single longer sentence still forms its own batch.
+    The number of such batches depends on the shuffle, so len() plans the next pass and iterating replays it.
+    '''
+
+    def __init__(self, lengths, batch_size, shuffle=True, bucket_size=100, max_tokens=0):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = bucket_size
+        self.max_tokens = max_tokens
+        # the batches of the next pass, once len() has been asked for them
+        self._next_pass = None
+
+    def __len__(self):
+        if not self.max_tokens:
+            return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+        if self._next_pass is None:
+            self._next_pass = self._plan()
+        return len(self._next_pass)
+
+    def __iter__(self):
+        batches = self._next_pass if self._next_pass is not None else self._plan()
+        self._next_pass = None
+        return iter(batches)
+
+    def _plan(self):
+        if self.shuffle:
+            order = np.random.permutation(len(self.lengths))
+            chunk = self.batch_size * self.bucket_size
+            buckets = [order[i:i + chunk] for i in range(0, len(order), chunk)]
+            order = [idx for bucket in buckets for idx in bucket[np.argsort(self.lengths[bucket], kind='stable')]]
+        else:
+            order = np.argsort(self.lengths, kind='stable')
+        batches = self._batches(order)
+        if self.shuffle:
+            batches = [batches[i] for i in np.random.permutation(len(batches))]
+        return batches
+
+    def _batches(self, order):
+        if not self.max_tokens:
+            return [[int(idx) for idx in order[i:i + self.batch_size]] for i in range(0, len(order), self.batch_size)]
+        batches = []
+        batch = []
+        batch_len = 0
+        for idx in order:
+            length = int(self.lengths[idx])
+            if batch and (len(batch) + 1) * max(batch_len, length) > self.max_tokens:
+                batches.append(batch)
+                batch = []
+                batch_len = 0
+            batch.append(int(idx))
+            batch_len = max(batch_len, length)
+        if batch:
+            batches.append(batch)
+        return batches
+
+
+class ArrayNerDataset(data.Dataset):
+    '''
+    Dataset over the flat arrays written by `save_feature_arrays`, memory-mapped by default, so a pool of
+    millions of sentences costs an offsets index instead of a Python object per word.
+    Items have the same layout as `NerDataset` items, so `NerDataset.pad` batches them.
+    '''
+
+    def __init__(self, path, mmap_mode='r'):
+        arrays = load_feature_arrays(path, mmap_mode=mmap_mode)
+        self.offsets = arrays['offsets']
+        self.input_ids = arrays['input_ids']
+        self.predict_mask = arrays['predict_mask']
+        self.label_ids = arrays['label_ids']
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def __getitem__(self, idx):
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        return (self.input_ids[start:end].tolist(), [1] * (end - start), [0] * (end - start),
+                self.predict_mask[start:end].tolist(), self.label_ids[start:end].tolist())
@@ -0,0 +1,92 @@
+import re
+import collections
+import numpy as np
+
+
+# character tables of the Persian normalization, applied with str.translate; None deletes the character
+NORMALIZATION_TABLES = {
+    # Arabic yeh, alef maksura and kaf, and their presentation forms, to the Persian letters
+    'yeh_kaf': dict([(char, '\u06cc') for char in '\u064a\u0649\ufef1\ufef2\ufef3\ufef4'] +
+                    [(char, '\u06a9') for char in '\u0643\ufed9\ufeda\ufedb\ufedc']),
+    # Arabic-Indic digits to the Persian ones
+    'digits': {chr(0x0660 + i): chr(0x06f0 + i) for i in range(10)},
+    # Arabic and Persian digits to ASCII, instead of 'digits'
+    'ascii_digits': dict([(chr(0x0660 + i), str(i)) for i in range(10)] + [(chr(0x06f0 + i), str(i)) for i in range(10)]),
+    # harakat, tanwin, shadda, sukun, superscript alef and tatweel (kashida)
+    'diacritics': dict([(chr(cp), None) for cp in range(0x064b, 0x0653)] + [('\u0670', None), ('\u0640', None)]),
+    # zero width space, joiner and word joiner to the zero width non-joiner, soft hyphen and byte order mark deleted
+    'zero_width': {'\u200b': '\u200c', '\u200d': '\u200c', '\u2060': '\u200c', '\u00ad': None, '\ufeff': None},
+}
+
+DEFAULT_NORMALIZATION = 'yeh_kaf,digits,diacritics,zero_width'
+
+# runs of zero width non-joiners
+_ZWNJ_RUNS = re.compile('\u200c{2,}')
+
+
+class PersianNormalizer(object):
+    '''
+    Maps the orthographic variants of Persian words to one canonical form, with the NORMALIZATION_TABLES
+    named in `tables` (comma separated) merged into a single str.translate table. Zero width non-joiners are
+    kept inside a word, where they separate its parts, but collapsed and stripped from its ends.
+    Words are pre-split, so a space and a zero width non-joiner between the parts of a word are not merged.
+    '''
+
+    def __init__(self, tables=DEFAULT_NORMALIZATION):
+        self.tables = [name.strip() for name in tables.split(',')] if isinstance(tables, str) else list(tables)
+        mapping = {}
+        for name in self.tables:
+            if name not in NORMALIZATION_TABLES:
+                raise ValueError('Unknown normalization table {}, choose from {}'.format(name, ', '.join(NORMALIZATION_TABLES)))
+            mapping.update(NORMALIZATION_TABLES[name])
+        self.table = str.maketrans(mapping)
+
+    def __str__(self):
+        return ','.join(self.tables)
+
+    def __call__(self, word):
+        normalized = word.translate(self.table)
+        if '\u200c' in normalized:
+            normalized = _ZWNJ_RUNS.sub('\u200c', normalized).strip('\u200c')
+        # a word made only of deleted characters keeps its original form rather than vanishing
+        return normalized or word
+
+    def normalize_words(self, words):
+        '''
+        the normalized form of every word of a list, e.g. all the words of a corpus; each distinct word is
+        normalized once and the forms are gathered back with numpy
+        '''
+        if not words:
+            return []
+        distinct, inverse = np.unique(np.array(words, dtype=object), return_inverse=True)
+        forms = np.array([self(word) for word in distinct], dtype=object)
+        return forms[inverse].tolist()
+
+
+def get_normalizer(tables):
+    '''
+    a PersianNormalizer from a --normalization argument, None for "none" or an empty string
+    '''
+    if not tables or tables == 'none':
+        return None
+    return PersianNormalizer(DEFAULT_NORMALIZATION if tables == 'default' else tables)
+
+
+def normalization_report(word_counts, normalizer, tokenizer, raw_tokenizer):
+    '''
+    distinct words and mean sub-words per word of a corpus, given as {word: count}, before normalization (tokenized
+    with `raw_tokenizer`) and after it (with `tokenizer`), as printable lines
+    '''
+    normalized_counts = collections.Counter()
+    for word, count in word_counts.items():
+        normalized_counts[normalizer(word)] += count
+    rows = []
+    for name, counts, name_tokenizer in (('raw', word_counts, raw_tokenizer),
+                                         ('normalized', normalized_counts, tokenizer)):
+        num_words = sum(counts.values())
+        num_sub_words = sum(count * len(name_tokenizer.tokenize(word)) for word, count in counts.items())
+        rows.append((name, num_words, len(counts), float(num_sub_words) / max(num_words, 1)))
+    lines = ['%-10s words %d, distinct %d, sub-words per word %.3f' % row for row in rows]
+    lines.append('normalization: %.1f%% fewer distinct words, %.1f%% fewer sub-words' % (
+        100. * (1 - rows[1][2] / max(rows[0][2], 1)), 100. * (1 - rows[1][3] / max(rows[0][3], 1e-12))))
+    return lines
@@ -0,0 +1,88 @@
+'''
+Inference on an ONNX export of BERT_CRF_NER (see export_onnx.py) without importing torch:
+onnxruntime computes the emission scores, the CRF is decoded in numpy.
+'''
+import os
+import numpy as np
+
+
+def viterbi_decode(feats, input_mask, transitions, start_label_id):
+    '''
+    numpy port of crf.CRF.viterbi_decode, feats: (batch_size, T, num_labels), input_mask: (batch_size, T).
+    returns the unnormalized best path score, the softmax over the final deltas and the best path
+    (0 at padded positions)
+    '''
+    batch_size, T, num_labels = feats.shape
+    log_delta = np.full((batch_size, num_labels), -10000., dtype=feats.dtype)
+    log_delta[:, start_label_id] = 0
+    all_delta = [log_delta]
+    psi = []
+    for t in range(1, T):
+        # transitions[i, j] is j -> i, so delta is broadcast over the "from" axis
+        scores = transitions + log_delta[:, None, :]
+        psi_t = scores.argmax(-1)
+        log_delta = np.take_along_axis(scores, psi_t[..., None], -1)[..., 0] + feats[:, t]
+        all_delta.append(log_delta)
+        psi.append(psi_t)
+
+    lengths = input_mask.sum(1).astype(np.int64)
+    log_delta = np.stack(all_delta)[lengths - 1, np.arange(batch_size)]
+    last_label = log_delta.argmax(-1)
+    path_score = log_delta.max(-1)
+    label_probs = np.exp(log_delta - path_score[:, None])
+    label_probs /= label_probs.sum(-1, keepdims=True)
+
+    # trace back, at padded positions the back pointer of state k is k itself so the path passes through
+    path = np.zeros((batch_size, T), dtype=np.int64)
+    path[:, T - 1] = last_label
+    if T > 1:
+        all_psi = np.where((input_mask[:, 1:] != 0).T[..., None], np.stack(psi), np.arange(num_labels))
+        for t in range(T - 2, -1, -1):
+            path[:, t] = np.take_along_axis(all_psi[t], path[:, t + 1][:, None], -1)[:, 0]
+    path = path * input_mask
+
+    return path_score, label_probs, path
+
+
+def confidence(label_probs, input_mask):
+    '''
+    numpy port of crf.CRF.confidence, (batch_size, 3) columns in crf.CONFIDENCE_COLUMNS (SE, NLC, Margin)
+    '''
+    top2 = -np.sort(-label_probs, axis=-1)[:, :2]
+    plogp = np.where(label_probs > 0, label_probs * np.log(np.maximum(label_probs, 1e-45)), 0.)
+    least_confidence = top2[:, 0] / input_mask.sum(1)
+    return np.stack([plogp.sum(-1), least_confidence, top2[:, 0] - top2[:, 1]], axis=1)
+
+
+class OnnxTagger(object):
+    '''
+    Tags padded batches of features (input_ids, segment_ids, input_mask as numpy arrays) with the
+    emissions.onnx and crf.npz written by export_onnx.py to `export_dir`.
+    '''
+
+    def __init__(self, export_dir, num_threads=0):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(os.path.join(export_dir, 'emissions.onnx'), options,
+                                                    providers=['CPUExecutionProvider'])
+        crf = np.load(os.path.join(export_dir, 'crf.npz'))
+        self.transitions = crf['transitions']
+        self.start_label_id = int(crf['start_label_id'])
+        self.stop_label_id = int(crf['stop_label_id'])
+        self.label_list = [str(label) for label in crf['labels']]
+
+    def emissions(self, input_ids, segment_ids, input_mask):
+        return self.session.run(['emissions'], {'input_ids': np.asarray(input_ids, dtype=np.int64),
+                                                'segment_ids': np.asarray(segment_ids, dtype=np.int64),
+                                                'input_mask': np.asarray(input_mask, dtype=np.int64)})[0]
+
+    def __call__(self, input_ids, segment_ids, input_mask):
+        '''
+        returns the (batch_size, 3) confidences and the best label path of every sentence, like BERT_CRF_NER.forward
+        '''
+        input_mask = np.asarray(input_mask, dtype=np.int64)
+        feats = self.emissions(input_ids, segment_ids, input_mask)
+        _, label_probs, path = viterbi_decode(feats, input_mask, self.transitions, self.start_label_id)
+        return confidence(label_probs, input_mask), path
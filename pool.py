@@ -0,0 +1,83 @@
+import os
+import numpy as np
+
+
+class ActiveLearningPool(object):
+    '''
+    Labeled and unlabeled sentence ids over one fixed corpus: the initial training set followed by the pool.
+    Moving sentences to the labeled set flips their ids and appends them to an append-only selection log
+    (round, sentence id, strategy, score per line), so the corpus files and the features cached for them are
+    never rewritten. The log is replayed on construction, so a restarted run continues from the last round.
+
+    It also caches the latest score of every pool sentence and the round it was computed in, so a round can
+    rescore only a subsample of the pool (sample_pool) and still select among all the cached scores.
+    '''
+
+    def __init__(self, num_labeled, num_sentences, log_file=None):
+        self.labeled = np.zeros(num_sentences, dtype=bool)
+        self.labeled[:num_labeled] = True
+        self.round = 0
+        self.log_file = log_file
+        self.scores = np.full(num_sentences, np.nan, dtype=np.float32)
+        self.scored_round = np.full(num_sentences, -1, dtype=np.int32)
+        if log_file is not None and os.path.exists(log_file):
+            with open(log_file) as f:
+                for line in f:
+                    pieces = line.split('\t')
+                    if len(pieces) < 2:
+                        continue
+                    self.round = max(self.round, int(pieces[0]))
+                    self.labeled[int(pieces[1])] = True
+
+    def __len__(self):
+        return len(self.labeled)
+
+    def labeled_ids(self):
+        return np.flatnonzero(self.labeled)
+
+    def unlabeled_ids(self):
+        return np.flatnonzero(~self.labeled)
+
+    def select(self, ids, strategy='', scores=None):
+        '''
+        Moves the sentences `ids` from the pool to the labeled set as a new round and logs them.
+        '''
+        ids = np.asarray(ids, dtype=np.int64)
+        if scores is None:
+            scores = np.full(len(ids), np.nan)
+        self.round += 1
+        self.labeled[ids] = True
+        if self.log_file is not None:
+            with open(self.log_file, 'a') as f:
+                for idx, score in zip(ids.tolist(), np.asarray(scores).tolist()):
+                    f.write('%d\t%d\t%s\t%.6g\n' % (self.round, idx, strategy, score))
+        return self.round
+
+    def sample_pool(self, size, refresh_every=0):
+        '''
+        The pool ids to score this round: all of them if `size` is 0 or on every `refresh_every`-th round,
+        otherwise the `size` with the stalest scores (never scored first, ties broken at random), so the
+        whole pool is rescored round-robin every len(pool) / size rounds. Returned in increasing order.
+        '''
+        ids = self.unlabeled_ids()
+        if size <= 0 or size >= len(ids) or (refresh_every > 0 and self.round % refresh_every == 0):
+            return ids
+        order = np.lexsort((np.random.random_sample(len(ids)), self.scored_round[ids]))
+        return np.sort(ids[order[:size]])
+
+    def update_scores(self, ids, scores):
+        self.scores[ids] = scores
+        self.scored_round[ids] = self.round
+
+    def least_confident(self, k):
+        '''
+        ids and cached scores of the `k` least confident pool sentences scored so far, least confident first
+        '''
+        ids = self.unlabeled_ids()
+        ids = ids[self.scored_round[ids] >= 0]
+        scores = self.scores[ids]
+        if len(ids) > k:
+            keep = np.argpartition(scores, k - 1)[:k] if k > 0 else []
+            ids, scores = ids[keep], scores[keep]
+        order = np.argsort(scores, kind='stable')
+        return ids[order], scores[order]
@@ -0,0 +1,193 @@
+'''
+Bulk tagging of a large file with a trained BERT_CRF_NER (ner_bert_crf_checkpoint.pt in --output_dir).
+The input is streamed: --input_format=text has one whitespace tokenized sentence per line, --input_format=iob
+is the training data format (the first column is the word, sentences end with a blank line). Sentences are
+tokenized in --num_workers processes, decoded in length sorted batches and written as they are done, in
+input order and in the IOB format ("word tag" lines, a blank line after each sentence).
+
+After every chunk <output_file>.offset records how far the input and the output got, and --resume continues
+from there after an interruption (--start_offset starts from any input byte offset instead).
+
+python predict.py --output_dir=./output --input_file=news.txt --output_file=news.iob --num_workers=8
+'''
+import os
+import sys
+import time
+import argparse
+import collections
+import multiprocessing
+import numpy as np
+
+
+def iter_sentences(input_file, input_format='text', start_offset=0):
+    '''
+    Yields (words, end offset) of every sentence of `input_file` from byte `start_offset` on, where the
+    end offset is where the next sentence starts, so reading can be resumed from it.
+    '''
+    words = []
+    with open(input_file, 'rb') as f:
+        f.seek(start_offset)
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            pieces = line.decode('utf-8').split()
+            if input_format == 'text':
+                if pieces:
+                    yield pieces, f.tell()
+            elif pieces:
+                words.append(pieces[0])
+            elif words:
+                yield words, f.tell()
+                words = []
+        if words:
+            yield words, f.tell()
+
+
+def iter_chunks(sentences, chunk_size):
+    chunk = []
+    for sentence in sentences:
+        chunk.append(sentence)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# the tokenizer, label map, max_seq_length and truncation of the tokenization processes, set before they are forked
+_featurize_args = None
+
+
+def featurize(sentences):
+    from features import example2feature
+    from active_learning import InputExample
+    tokenizer, label_map, max_seq_length, truncate = _featurize_args
+    return [example2feature(InputExample(guid=i, words=words, labels=['O'] * len(words)),
+                            tokenizer, label_map, max_seq_length, truncate) for i, words in enumerate(sentences)]
+
+
+def read_progress(offset_file):
+    with open(offset_file) as f:
+        input_offset, output_offset = f.read().split()
+    return int(input_offset), int(output_offset)
+
+
+def write_progress(offset_file, input_offset, output_offset):
+    with open(offset_file + '.tmp', 'w') as f:
+        f.write('%d %d\n' % (input_offset, output_offset))
+    os.replace(offset_file + '.tmp', offset_file)
+
+
+def main():
+    global _featurize_args
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default=None, type=str, required=True,
+                        help="The directory of ner_bert_crf_checkpoint.pt.")
+    parser.add_argument("--input_file", default=None, type=str, required=True, help="The file to tag.")
+    parser.add_argument("--output_file", default=None, type=str, required=True, help="Where the tagged sentences are written.")
+    parser.add_argument("--input_format", default='text', choices=['text', 'iob'], type=str,
+                        help="text: one sentence per line, iob: the training data format.")
+    parser.add_argument("--bert_model_scale", default='bert-base-multilingual-cased', type=str,
+                        help="The pre-trained Bert model the checkpoint was trained from.")
+    parser.add_argument("--max_seq_length", default=180, type=int, help="Max sequence length.")
+    parser.add_argument("--batch_size", default=32, type=int, help="Sentences per decoded batch.")
+    parser.add_argument("--chunk_size", default=1024, type=int,
+                        help="Sentences tokenized per task and sorted by length for batching; memory is bounded "
+                        "by 2 * num_workers chunks.")
+    parser.add_argument("--num_workers", default=4, type=int, help="Tokenization processes, 0 tokenizes in this process.")
+    parser.add_argument("--resume", action='store_true', help="Continue from <output_file>.offset.")
+    parser.add_argument("--start_offset", default=0, type=int, help="Input byte offset to start from, without --resume.")
+    parser.add_argument("--window_stride", default=None, type=int,
+                        help="Sentences longer than max_seq_length are encoded in overlapping windows this many "
+                        "sub-words apart (at most max_seq_length - 2), defaults to half a window; 0 truncates them instead.")
+    parser.add_argument("--quantize", default='none', choices=['none', 'int8'], type=str,
+                        help="int8: tag on CPU with a dynamically quantized copy of the model.")
+    parser.add_argument("--normalization", default='none', type=str,
+                        help="Persian normalization of the words, as the model was trained with: none, default or "
+                        "comma separated normalization.NORMALIZATION_TABLES. The output keeps the original words.")
+    args = parser.parse_args()
+    window_stride = args.window_stride if args.window_stride is not None else max((args.max_seq_length - 2) // 2, 1)
+
+    import torch
+    from pytorch_pretrained_bert.tokenization import BertTokenizer
+    from active_learning import CoNLLDataProcessor, load_model, quantize_model, device
+    from fast_tokenizer import FastBertTokenizer
+    from normalization import get_normalizer
+    from tagger import NerTagger
+
+    offset_file = args.output_file + '.offset'
+    input_offset, output_offset = args.start_offset, 0
+    if args.resume and os.path.exists(offset_file):
+        input_offset, output_offset = read_progress(offset_file)
+        print('Resuming from input byte %d, output byte %d' % (input_offset, output_offset))
+    elif args.resume:
+        print('No', offset_file, 'to resume from, starting at byte', input_offset)
+
+    label_list = CoNLLDataProcessor().get_labels()
+    tokenizer = FastBertTokenizer(BertTokenizer.from_pretrained(args.bert_model_scale, do_lower_case=False),
+                                  get_normalizer(args.normalization))
+    _featurize_args = (tokenizer, {label: i for i, label in enumerate(label_list)}, args.max_seq_length,
+                       window_stride <= 0)
+    # forked before the model is loaded, the processes only need the tokenizer
+    workers = multiprocessing.get_context('fork').Pool(args.num_workers) if args.num_workers > 0 else None
+
+    model = load_model(os.path.join(args.output_dir, 'ner_bert_crf_checkpoint.pt'), args.bert_model_scale,
+                       args.max_seq_length)
+    tagging_device = device
+    if args.quantize == 'int8':
+        model = quantize_model(model)
+        tagging_device = torch.device('cpu')
+    tagger = NerTagger(model, tokenizer, label_list, args.max_seq_length, tagging_device, window_stride)
+
+    def tag_chunk(chunk, features):
+        # decoded in length sorted batches, written in input order
+        results = [None] * len(chunk)
+        order = np.argsort([len(feat.input_ids) for feat in features], kind='stable')
+        for start in range(0, len(order), args.batch_size):
+            batch = order[start:start + args.batch_size]
+            confidence, paths = tagger.decode([features[i] for i in batch])
+            for i, result in zip(batch, tagger.results([chunk[i][0] for i in batch], [features[i] for i in batch],
+                                                       confidence, paths)):
+                results[i] = result
+        return results
+
+    start = time.time()
+    num_sentences = 0
+    mode = 'r+b' if output_offset > 0 and os.path.exists(args.output_file) else 'wb'
+    with open(args.output_file, mode) as writer:
+        writer.seek(output_offset)
+        writer.truncate()
+        pending = collections.deque()
+        chunks = iter_chunks(iter_sentences(args.input_file, args.input_format, input_offset), args.chunk_size)
+        try:
+            while True:
+                # keep the tokenization processes busy while the model decodes
+                while workers is not None and len(pending) < 2 * args.num_workers:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending.append((chunk, workers.apply_async(featurize, ([words for words, _ in chunk],))))
+                if workers is None:
+                    chunk = next(chunks, None)
+                    if chunk is not None:
+                        pending.append((chunk, None))
+                if not pending:
+                    break
+                chunk, features = pending.popleft()
+                features = features.get() if features is not None else featurize([words for words, _ in chunk])
+                for result in tag_chunk(chunk, features):
+                    writer.write(''.join('%s %s\n' % (word, tag) for word, tag in zip(result['words'], result['tags']))
+                                 .encode('utf-8') + b'\n')
+                writer.flush()
+                num_sentences += len(chunk)
+                write_progress(offset_file, chunk[-1][1], writer.tell())
+                print('Tagged %d sentences, %.1f sentences/s, input byte %d' % (
+                    num_sentences, num_sentences / (time.time() - start), chunk[-1][1]), file=sys.stderr)
+        finally:
+            if workers is not None:
+                workers.terminate()
+
+
+if __name__ == "__main__":
+    main()
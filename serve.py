@@ -0,0 +1,202 @@
+'''
+NER tagging service around a trained BERT_CRF_NER (ner_bert_crf_checkpoint.pt in --output_dir).
+Concurrent requests are collected into micro-batches of at most --max_batch_size sentences, a batch runs
+as soon as it is full or its oldest sentence has waited --max_wait_ms.
+
+HTTP:  python serve.py --output_dir=./output --mode=http --port=8000
+       POST /tag {"sentences": ["...", ...]} -> [{"words": [...], "tags": [...], "confidence": {...}}, ...]
+       GET /stats -> p50/p99 latency and throughput
+stdio: python serve.py --output_dir=./output --mode=stdio < sentences.txt > tagged.jsonl
+       one sentence per input line, one JSON result per output line, in input order
+'''
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import collections
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+
+class MicroBatcher(object):
+    '''
+    Runs `tag_batch` (a list of sentences -> a list of results) on micro-batches of the sentences submitted
+    from any number of threads, in one background thread, and keeps latency and throughput statistics.
+    '''
+
+    def __init__(self, tag_batch, max_batch_size=32, max_wait_ms=10.0, num_latencies=10000):
+        self.tag_batch = tag_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        # seconds from submit to result of the latest sentences
+        self.latencies = collections.deque(maxlen=num_latencies)
+        self.num_sentences = 0
+        self.num_batches = 0
+        self.start_time = time.time()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, sentence):
+        '''
+        queues one sentence, returns a Future of its result
+        '''
+        future = Future()
+        self.requests.put((time.time(), sentence, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = batch[0][0] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                # past the deadline, only the sentences already queued still join the batch
+                timeout = deadline - time.time()
+                try:
+                    batch.append(self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                results = self.tag_batch([sentence for _, sentence, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            done = time.time()
+            for (submitted, _, future), result in zip(batch, results):
+                self.latencies.append(done - submitted)
+                future.set_result(result)
+            self.num_sentences += len(batch)
+            self.num_batches += 1
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000.0
+        elapsed = time.time() - self.start_time
+        return {'sentences': self.num_sentences,
+                'batches': self.num_batches,
+                'mean_batch_size': self.num_sentences / max(self.num_batches, 1),
+                'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+                'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+                'sentences_per_s': self.num_sentences / max(elapsed, 1e-9)}
+
+
+def make_handler(batcher):
+
+    class TagHandler(BaseHTTPRequestHandler):
+
+        def _reply(self, code, body):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/stats':
+                return self._reply(404, {'error': 'not found'})
+            self._reply(200, batcher.stats())
+
+        def do_POST(self):
+            if self.path != '/tag':
+                return self._reply(404, {'error': 'not found'})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+                sentences = request['sentences'] if 'sentences' in request else [request['text']]
+            except (ValueError, KeyError, TypeError):
+                sentences = None
+            if not isinstance(sentences, list) or not all(isinstance(sentence, str) for sentence in sentences):
+                return self._reply(400, {'error': 'expected {"sentences": ["...", ...]} or {"text": "..."}'})
+            # every sentence is batched on its own, together with those of the other requests
+            futures = [batcher.submit(sentence.split()) for sentence in sentences]
+            try:
+                results = [future.result() for future in futures]
+            except Exception as e:
+                return self._reply(500, {'error': '%s: %s' % (type(e).__name__, e)})
+            self._reply(200, results)
+
+        def log_message(self, format, *args):
+            pass
+
+    return TagHandler
+
+
+def serve_stdio(batcher, max_pending, stdin=sys.stdin, stdout=sys.stdout):
+    '''
+    tags stdin line by line, keeping up to `max_pending` sentences in flight so they can share batches
+    '''
+    pending = collections.deque()
+    for line in stdin:
+        pending.append(batcher.submit(line.split()))
+        while len(pending) >= max_pending or (pending and pending[0].done()):
+            stdout.write(json.dumps(pending.popleft().result(), ensure_ascii=False) + '\n')
+    while pending:
+        stdout.write(json.dumps(pending.popleft().result(), ensure_ascii=False) + '\n')
+    stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default=None, type=str, required=True,
+                        help="The directory of ner_bert_crf_checkpoint.pt.")
+    parser.add_argument("--bert_model_scale", default='bert-base-multilingual-cased', type=str,
+                        help="The pre-trained Bert model the checkpoint was trained from.")
+    parser.add_argument("--max_seq_length", default=180, type=int, help="Max sequence length.")
+    parser.add_argument("--mode", default='http', choices=['http', 'stdio'], type=str, help="Serve over HTTP or stdin/stdout.")
+    parser.add_argument("--host", default='127.0.0.1', type=str, help="HTTP host.")
+    parser.add_argument("--port", default=8000, type=int, help="HTTP port.")
+    parser.add_argument("--max_batch_size", default=32, type=int, help="Sentences per micro-batch.")
+    parser.add_argument("--max_wait_ms", default=10.0, type=float,
+                        help="Longest a sentence waits for its micro-batch to fill up.")
+    parser.add_argument("--window_stride", default=None, type=int,
+                        help="Sentences longer than max_seq_length are encoded in overlapping windows this many "
+                        "sub-words apart (at most max_seq_length - 2), defaults to half a window; 0 truncates them instead.")
+    parser.add_argument("--quantize", default='none', choices=['none', 'int8'], type=str,
+                        help="int8: tag on CPU with a dynamically quantized copy of the model.")
+    parser.add_argument("--normalization", default='none', type=str,
+                        help="Persian normalization of the words, as the model was trained with: none, default or "
+                        "comma separated normalization.NORMALIZATION_TABLES. The output keeps the original words.")
+    args = parser.parse_args()
+    window_stride = args.window_stride if args.window_stride is not None else max((args.max_seq_length - 2) // 2, 1)
+    results = sys.stdout
+    if args.mode == 'stdio':
+        # stdout only carries results, the logging of the imports and the model goes to stderr
+        sys.stdout = sys.stderr
+
+    import torch
+    from pytorch_pretrained_bert.tokenization import BertTokenizer
+    from active_learning import CoNLLDataProcessor, load_model, quantize_model, device
+    from fast_tokenizer import FastBertTokenizer
+    from normalization import get_normalizer
+    from tagger import NerTagger
+
+    model = load_model(os.path.join(args.output_dir, 'ner_bert_crf_checkpoint.pt'), args.bert_model_scale,
+                       args.max_seq_length)
+    tagging_device = device
+    if args.quantize == 'int8':
+        model = quantize_model(model)
+        tagging_device = torch.device('cpu')
+    tokenizer = FastBertTokenizer(BertTokenizer.from_pretrained(args.bert_model_scale, do_lower_case=False),
+                                  get_normalizer(args.normalization))
+    tagger = NerTagger(model, tokenizer, CoNLLDataProcessor().get_labels(), args.max_seq_length, tagging_device,
+                       window_stride)
+    batcher = MicroBatcher(tagger.tag, args.max_batch_size, args.max_wait_ms)
+
+    if args.mode == 'stdio':
+        serve_stdio(batcher, 2 * args.max_batch_size, stdout=results)
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher))
+        print('Serving on http://%s:%d (POST /tag, GET /stats)' % (args.host, args.port), file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+    print(json.dumps(batcher.stats()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import numpy as np
+import torch
+from crf import CONFIDENCE_COLUMNS
+from features import CachedTokenizer, example2feature
+from active_learning import InputExample, NerDataset
+
+
+class NerTagger(object):
+    '''
+    Tags sentences, given as lists of words, with a trained BERT_CRF_NER (see active_learning.load_model),
+    one padded batch per call. Each result holds the IOB tag of every word and the SE, NLC and Margin
+    confidences of the sentence. Sentences longer than max_seq_length are decoded whole in overlapping
+    windows `stride` sub-words apart (BERT_CRF_NER.decode_windows), or with stride=0 cut off at
+    max_seq_length, the words after the cut are tagged O. Words are only ever tagged O, B-* or I-*: a word
+    decoded as X, [CLS] or [SEP] is tagged O.
+    '''
+
+    def __init__(self, model, tokenizer, label_list, max_seq_length, device, stride=0):
+        self.model = model.eval()
+        self.tokenizer = tokenizer if isinstance(tokenizer, CachedTokenizer) else CachedTokenizer(tokenizer)
+        self.label_list = label_list
+        self.label_map = {label: i for i, label in enumerate(label_list)}
+        self.word_tags = [label if label[:2] in ('B-', 'I-') else 'O' for label in label_list]
+        self.max_seq_length = max_seq_length
+        self.device = device
+        self.stride = stride
+
+    def featurize(self, words, guid=0):
+        # the labels are not known, every word gets O
+        example = InputExample(guid=guid, words=words, labels=['O'] * len(words))
+        return example2feature(example, self.tokenizer, self.label_map, self.max_seq_length, truncate=self.stride <= 0)
+
+    def decode(self, features):
+        '''
+        (batch_size, 3) confidences and the label path of every one of a list of InputFeatures, as numpy arrays
+        '''
+        confidence = np.zeros((len(features), len(CONFIDENCE_COLUMNS)), dtype=np.float32)
+        paths = [None] * len(features)
+        short = [i for i, f in enumerate(features) if len(f.input_ids) <= self.max_seq_length]
+        with torch.no_grad():
+            if short:
+                batch = NerDataset.pad([(features[i].input_ids, features[i].input_mask, features[i].segment_ids,
+                                         features[i].predict_mask, features[i].label_ids) for i in short])
+                input_ids, input_mask, segment_ids, _, _ = tuple(t.to(self.device) for t in batch)
+                batch_confidence, label_seq_ids = self.model(input_ids, segment_ids, input_mask)
+                confidence[short] = batch_confidence.cpu().numpy()
+                for i, path in zip(short, label_seq_ids.cpu().numpy()):
+                    paths[i] = path
+            for i, f in enumerate(features):
+                if paths[i] is None:
+                    input_ids = torch.tensor(f.input_ids, dtype=torch.long, device=self.device)
+                    window_confidence, label_seq_ids = self.model.decode_windows(input_ids, self.stride)
+                    confidence[i] = window_confidence[0].cpu().numpy()
+                    paths[i] = label_seq_ids[0].cpu().numpy()
+        return confidence, paths
+
+    def results(self, sentences, features, confidence, paths):
+        results = []
+        for words, feat, conf, path in zip(sentences, features, confidence, paths):
+            word_labels = path[:len(feat.predict_mask)][np.asarray(feat.predict_mask, dtype=bool)]
+            tags = [self.word_tags[i] for i in word_labels] + ['O'] * (len(words) - len(word_labels))
+            results.append({'words': words, 'tags': tags,
+                            'confidence': {name: float(conf[i]) for name, i in CONFIDENCE_COLUMNS.items()}})
+        return results
+
+    def tag(self, sentences):
+        features = [self.featurize(words, i) for i, words in enumerate(sentences)]
+        confidence, paths = self.decode(features)
+        return self.results(sentences, features, confidence, paths)